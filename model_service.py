@@ -2,6 +2,8 @@ from bentoml import env, artifacts, api, BentoService
 from bentoml.adapters import DataframeInput, JsonInput
 from bentoml.frameworks.sklearn import SklearnModelArtifact
 from bentoml.service.artifacts.common import PickleArtifact, TextFileArtifact
+from sinara.bentoservice.microbatch import MicroBatcher
+import threading
 
 @env(infer_pip_packages=True)
 @artifacts([SklearnModelArtifact('model'),
@@ -10,8 +12,20 @@ from bentoml.service.artifacts.common import PickleArtifact, TextFileArtifact
                              file_extension='.txt',
                              encoding='utf8')]) # for versions of bentoml 0.13 and newer   
 class ModelService(BentoService): 
+    _micro_batcher = None
+    _micro_batcher_lock = threading.Lock()
+
     @api(input=DataframeInput(), batch=True)
     def predict(self, df):
+        """ Predict rows of concurrent requests by a single model call """
+        with self._micro_batcher_lock:
+            if self._micro_batcher is None:
+                self._micro_batcher = MicroBatcher(self.artifacts.model.predict)
+        return self._micro_batcher.predict(df)
+
+    @api(input=DataframeInput(), batch=True)
+    def predict_unbatched(self, df):
+        """ Predict rows of the request by a model call of its own, baseline of predict """
         return self.artifacts.model.predict(df.values)
         
     @api(input=DataframeInput(), batch=True)
@@ -1,11 +1,26 @@
+import io
 import os
+import re
+import stat
+import json
 import shutil
+import time
+import zlib
+import hashlib
+import threading
+import tempfile
+import fnmatch
+import dataclasses
+from collections import namedtuple
+from datetime import datetime
 from os import path
 from pathlib import Path
 from functools import partial
-from pyspark.sql.functions import regexp_replace,col,lit
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from urllib.parse import urlsplit
 import logging
+from .fs import SinaraFileSystem
+from .cache import SinaraLocalCache, SinaraChunkCache
 from .settings import _SinaraSettings
 from .substep import get_tmp_work_path
 
@@ -20,20 +35,427 @@ def get_row_size():
         return _SinaraSettings.get_storage_row_size()
     else:
         return 1024 * 1024
+
+def get_unpack_workers():
+    if hasattr(_SinaraSettings, 'get_storage_unpack_workers'):
+        return _SinaraSettings.get_storage_unpack_workers()
+    else:
+        return 4
+
+def get_cache_size():
+    if hasattr(_SinaraSettings, 'get_storage_cache_size'):
+        return _SinaraSettings.get_storage_cache_size()
+    else:
+        return 10 * 1024 * 1024 * 1024
+
+# relPath of a chunk of a split file: /<file>.parts/part-NNNN
+PART_PATH_REGEX = r'^/?(.*)\.parts/part-(\d+)$'
+
+# Archive metadata stored next to the parquet files, ignored by Apache Spark readers as it starts with '_'
+ARCHIVE_INFO_FILE_NAME = '_ARCHIVE_INFO'
+ARCHIVE_FORMAT_DEDUP = 'dedup'
+# relPath and length of every archive row, lets selective unpacking skip the scan of the relPath column
+PATH_INDEX_FILE_NAME = '_PATH_INDEX'
+
+# Parquet codecs of SinaraArchive, zstd accepts level as 'zstd:<level>'
+COMPRESSION_CODECS = ['none', 'snappy', 'zstd', 'lz4']
+# Candidates measured on sampled chunks by 'auto' compression
+AUTO_COMPRESSION_CANDIDATES = ['snappy', 'lz4', 'zstd:1', 'zstd:3', 'zstd:9']
+
+# Non-cryptographic checksums of archive rows, xxh64 requires xxhash package
+CHECKSUM_ALGORITHMS = ['xxh64', 'crc32']
+
+def get_checksum_algorithm():
+    try:
+        import xxhash
+        return 'xxh64'
+    except ImportError:
+        return 'crc32'
  
-def SinaraArchive_save_file(file_col, tmp_entity_dir):
+def SinaraArchive_save_file(file_col, tmp_entity_dir, checksum=None):
     '''
     _save_file defined as function since runtime error when declared as method:
     It appears that you are attempting to reference SparkContext from a broadcast variable, action, or transformation.
     SparkContext can only be used on the driver, not in code that it run on workers. For more information, see SPARK-5063.
+    @param checksum - algorithm of the 'checksum' column to verify content with, no verification if None
     '''
+    _verify_checksum(file_col, checksum)
     file_name = path.join(tmp_entity_dir, file_col.relPath.strip('/'))
     file_binary = file_col.content
 
     os.makedirs(path.dirname(file_name), exist_ok=True)
     with open(file_name, 'wb') as f_id:
         f_id.write(file_binary)
+
+def SinaraArchive_write_row(row, tmp_entity_dir, parts_layout, checksum=None):
+    '''
+    Writes the archive row to the temporary directory, chunks of split files are written
+    straight to their offsets inside the target files preallocated beforehand
+    @param parts_layout - dict of chunk size by relative path of every split file
+    @param checksum - see SinaraArchive_save_file
+    @return relative path of the split file if the row is its part, None otherwise
+    '''
+    part = re.match(PART_PATH_REGEX, row.relPath)
+    if part:
+        _verify_checksum(row, checksum)
+        file_name = path.join(tmp_entity_dir, part.group(1))
+        offset = int(part.group(2)) * parts_layout[part.group(1)]
+        fd = os.open(file_name, os.O_WRONLY)
+        try:
+            _pwrite_all(fd, row.content, offset)
+        finally:
+            os.close(fd)
+        return part.group(1)
+    elif not row.relPath.endswith('.parts/_PARTS'):
+        SinaraArchive_save_file(row, tmp_entity_dir, checksum=checksum)
+    return None
+
+def SinaraArchive_write_partition(rows, tmp_entity_dir, parts_layout, workers, checksum=None):
+    '''
+    Streaming counterpart of SinaraArchive_save_file, runs for every partition of the archive dataframe.
+    Rows are written by SinaraArchive_write_row, so neither '.parts' directories nor the join pass are needed.
+    @param parts_layout - dict of chunk size by relative path of every split file
+    @param workers - number of threads writing rows of the partition
+    @param checksum - see SinaraArchive_save_file
+    @return list of relative path and number of written parts of every split file,
+            split files are preallocated, so parts missing in the archive can't be told by the size of the file
+    '''
+    written_parts = {}
+    written_parts_lock = threading.Lock()
+
+    def write_row(row):
+        file_rel_path = SinaraArchive_write_row(row, tmp_entity_dir, parts_layout, checksum=checksum)
+        if file_rel_path is not None:
+            with written_parts_lock:
+                written_parts[file_rel_path] = written_parts.get(file_rel_path, 0) + 1
+
+    _bounded_map(write_row, rows, workers)
+    return list(written_parts.items())
+
+def SinaraArchive_write_fetched_partition(rows, tmp_entity_dir, parts_layout, chunk_cache_dir, workers):
+    '''
+    Writes chunks fetched from the chunk store of the deduplicating archive, runs for every partition of the joined dataframe.
+    Content of every chunk is verified against its hash and added to the local chunk cache before it is written.
+    @param chunk_cache_dir - directory of SinaraChunkCache
+    '''
+    chunk_cache = SinaraChunkCache(chunk_cache_dir, 0)
+
+    def write_row(row):
+        chunk_cache.put(row.hash, row.content)
+        SinaraArchive_write_row(row, tmp_entity_dir, parts_layout)
+
+    _bounded_map(write_row, rows, workers)
+
+# Row of the archive with content taken from the local chunk cache
+_SinaraArchiveChunkRow = namedtuple('_SinaraArchiveChunkRow', ['relPath', 'content'])
+
+# Byte range of a file in the temporary directory packed as a single archive row
+SinaraArchiveChunk = namedtuple('SinaraArchiveChunk', ['relPath', 'path', 'offset', 'length', 'modificationTime'])
+
+def SinaraArchive_read_chunk(chunk, checksum=None, checksums=None):
+    '''
+    Reads the byte range described by SinaraArchiveChunk straight from the original file,
+    defined as function for the same reason as SinaraArchive_save_file.
+    @param checksum - algorithm of the checksum appended to the row, no checksum if None
+    @param checksums - Apache Spark accumulator of SinaraArchiveChecksums the checksum of the row is added to
+    @return row in the archive schema: modificationTime, length, content, relPath and optional checksum
+    '''
+    content = b''
+    if chunk.length > 0:
+        with open(chunk.path, 'rb') as f_id:
+            content = os.pread(f_id.fileno(), chunk.length, chunk.offset)
+    row = (datetime.fromtimestamp(chunk.modificationTime), len(content), content, chunk.relPath)
+    if checksum is None:
+        return row
+    row_checksum = _checksum(content, checksum)
+    if checksums is not None:
+        checksums.add({chunk.relPath: row_checksum})
+    return row + (row_checksum,)
+
+def SinaraArchive_checksum_content(content, rel_path, checksum, checksums):
+    '''
+    Computes the checksum column of the archive dataframe packed from '.parts' directories
+    @param checksums - see SinaraArchive_read_chunk
+    '''
+    row_checksum = _checksum(content, checksum)
+    checksums.add({rel_path: row_checksum})
+    return row_checksum
+
+class SinaraArchiveChecksums:
+    '''
+    Apache Spark accumulator param collecting checksums of archive rows by relPath while rows are written,
+    rows recomputed by retried tasks have the same checksums, so merging them is idempotent
+    '''
+
+    def zero(self, value):
+        return {}
+
+    def addInPlace(self, value1, value2):
+        value1.update(value2)
+        return value1
+
+def SinaraArchive_map_chunks(chunks, func):
+    '''
+    Applies func to every chunk of the planned partition, used with flatMap over SinaraArchivePlan partitions
+    '''
+    return map(func, chunks)
+
+def SinaraArchive_hash_chunk(chunk):
+    '''
+    Computes content hash of the byte range described by SinaraArchiveChunk
+    @return tuple of the chunk and its hash
+    '''
+    return (chunk, hashlib.sha256(SinaraArchive_read_chunk(chunk)[2]).hexdigest())
+
+def SinaraArchive_read_hashed_chunk(hashed_chunk):
+    '''
+    Reads content of the chunk for the chunk store of deduplicating archives
+    @return row in the chunk store schema: hash, length, content
+    '''
+    chunk, chunk_hash = hashed_chunk
+    content = SinaraArchive_read_chunk(chunk)[2]
+    return (chunk_hash, len(content), content)
+
+def _parse_compression(compression):
+    '''
+    @return codec name and level of the compression spec like 'snappy' or 'zstd:3'
+    '''
+    codec, _, level = str(compression).lower().partition(':')
+    if codec not in COMPRESSION_CODECS:
+        raise Exception(f"Unexpected compression '{compression}', supported codecs are {COMPRESSION_CODECS} and 'auto'")
+    if level and codec != 'zstd':
+        raise Exception(f"Compression level is supported for 'zstd' codec only, got '{compression}'")
+    return codec, int(level) if level else None
+
+def _resolve_checksum(checksum):
+    '''
+    @param checksum - True for the default algorithm, False or None to disable checksums or the algorithm name
+    @return algorithm name or None
+    '''
+    if not checksum:
+        return None
+    if checksum is True:
+        return get_checksum_algorithm()
+    if checksum not in CHECKSUM_ALGORITHMS:
+        raise Exception(f"Unexpected checksum '{checksum}', supported algorithms are {CHECKSUM_ALGORITHMS}")
+    return checksum
+
+def _checksum(content, algorithm):
+    if algorithm == 'xxh64':
+        import xxhash
+        return xxhash.xxh64_hexdigest(content)
+    return f'{zlib.crc32(content):08x}'
+
+def _verify_checksum(row, checksum):
+    if checksum and row.checksum is not None and _checksum(row.content, checksum) != row.checksum:
+        raise Exception(f"Checksum mismatch of the archive row '{row.relPath}'")
+
+def _file_checksums(rows, algorithm):
+    '''
+    Checksum of the file is the checksum of checksums of its chunks in the order of offsets,
+    so it is computed from archive rows metadata without reading the content
+    @param rows - iterable of relPath and checksum of archive rows
+    @return dict of checksums by path of the file relative to the entity directory
+    '''
+    file_chunks = {}
+    for rel_path, chunk_checksum in rows:
+        if rel_path.endswith('.parts/_PARTS'):
+            continue
+        part = re.match(PART_PATH_REGEX, rel_path)
+        file_chunks.setdefault(_file_rel_path(rel_path), []).append((int(part.group(2)) if part else 0, chunk_checksum))
+    return {file_rel_path: _checksum(' '.join(x for _, x in sorted(chunks)).encode(), algorithm)
+            for file_rel_path, chunks in file_chunks.items()}
+
+def _verify_file_checksums(store_path, rows, path_index, algorithm, include=None):
+    '''
+    Compares the unpacked archive rows with the rows of the path index and checksums of files computed from them
+    with the ones recorded at packing, so files with missing chunks are detected without a second pass over the content.
+    Rows are compared for archives packed without checksums too.
+    @param rows - iterable of relPath and checksum of the unpacked archive rows, checksum is None without checksums
+    '''
+    if not path_index:
+        return
+    rows = list(rows)
+    unpacked_rel_paths = {rel_path for rel_path, _ in rows}
+    expected_rows = path_index['rows'] if include is None else _select_rows(path_index['rows'], include)
+    missing = sorted(rel_path for rel_path, _ in expected_rows if rel_path not in unpacked_rel_paths)
+    if missing:
+        raise Exception(f"{len(missing)} rows are missing in the archive '{store_path}': {missing[:10]}")
+    if not algorithm or 'files' not in path_index:
+        return
+    actual = _file_checksums(rows, algorithm)
+    mismatched = sorted(file_rel_path for file_rel_path, file_checksum in path_index['files'].items()
+                        if (include is None or _match_include(file_rel_path, include)) and actual.get(file_rel_path) != file_checksum)
+    if mismatched:
+        raise Exception(f"Checksum mismatch of {len(mismatched)} files in the archive '{store_path}': {mismatched[:10]}")
+
+def _write_store_json(store_path, file_name, content):
+    fs = SinaraFileSystem.FileSystem()
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f_id:
+        json.dump(content, f_id)
+    try:
+        fs.put(f_id.name, f'{store_path}/{file_name}')
+    finally:
+        os.remove(f_id.name)
+
+def _read_store_json(store_path, file_name):
+    """
+    @return content of the json file in the store path or None if there is no such file
+    """
+    fs = SinaraFileSystem.FileSystem()
+    json_path = f'{store_path}/{file_name}'
+    if not fs.exists(json_path):
+        return None
+    tmp_fd, tmp_file_name = tempfile.mkstemp(suffix='.json')
+    os.close(tmp_fd)
+    try:
+        fs.get(json_path, tmp_file_name)
+        with open(tmp_file_name) as f_id:
+            return json.load(f_id)
+    finally:
+        os.remove(tmp_file_name)
+
+def _write_archive_info(store_path, archive_info):
+    _write_store_json(store_path, ARCHIVE_INFO_FILE_NAME, archive_info)
+
+def _read_archive_info(store_path):
+    return _read_store_json(store_path, ARCHIVE_INFO_FILE_NAME) or {}
+
+def _write_path_index(store_path, chunks, file_checksums=None):
+    path_index = {'rows': [[chunk.relPath, chunk.length] for chunk in chunks]}
+    if file_checksums is not None:
+        path_index['files'] = file_checksums
+    _write_store_json(store_path, PATH_INDEX_FILE_NAME, path_index)
+
+def _read_path_index(store_path):
+    """
+    @return dict with 'rows' list of relPath and length of archive rows and optional 'files' dict of file checksums
+            or None for archives packed without the path index
+    """
+    path_index = _read_store_json(store_path, PATH_INDEX_FILE_NAME)
+    if path_index is not None:
+        path_index['rows'] = [tuple(x) for x in path_index['rows']]
+    return path_index
+
+def _file_rel_path(rel_path):
+    """
+    @return path relative to the entity directory of the file the archive row belongs to
+    """
+    part = re.match(PART_PATH_REGEX, rel_path)
+    if part:
+        return part.group(1)
+    if rel_path.endswith('.parts/_PARTS'):
+        return rel_path[:-len('.parts/_PARTS')].lstrip('/')
+    return rel_path.lstrip('/')
+
+def _select_rows(rows, include):
+    """
+    @param rows - iterable of relPath and length of archive rows
+    @param include - list of globs matched by fnmatch against paths of files relative to the entity directory
+    @return list of relPath and length of rows belonging to the matching files
+    """
+    return [(rel_path, length) for rel_path, length in rows if _match_include(_file_rel_path(rel_path), include)]
+
+def _match_include(file_rel_path, include):
+    return any(fnmatch.fnmatchcase(file_rel_path, x.lstrip('/')) for x in include)
+
+def _parts_layout(rows):
+    """
+    @param rows - iterable of relPath and length of archive rows
+    @return dicts of chunk size and of total size by relative path of every split file
+    """
+    parts_layout = {}
+    file_sizes = {}
+    for rel_path, length in rows:
+        part = re.match(PART_PATH_REGEX, rel_path)
+        if part:
+            parts_layout[part.group(1)] = max(parts_layout.get(part.group(1), 0), length)
+            file_sizes[part.group(1)] = file_sizes.get(part.group(1), 0) + length
+    return parts_layout, file_sizes
+
+def _parts_counts(rows):
+    """
+    @param rows - iterable of relPath and length of archive rows
+    @return dict of number of parts by relative path of every split file
+    """
+    parts_counts = {}
+    for rel_path, _ in rows:
+        part = re.match(PART_PATH_REGEX, rel_path)
+        if part:
+            parts_counts[part.group(1)] = parts_counts.get(part.group(1), 0) + 1
+    return parts_counts
+
+def _verify_written_parts(expected_parts, written_parts):
+    """
+    @param expected_parts - dict of number of parts by relative path of every split file the archive must have
+    @param written_parts - iterable of relative path and number of parts written by SinaraArchive_write_partition
+    """
+    written = {}
+    for file_rel_path, count in written_parts:
+        written[file_rel_path] = written.get(file_rel_path, 0) + count
+    incomplete = sorted(x for x, count in expected_parts.items() if written.get(x, 0) < count)
+    if incomplete:
+        raise Exception(f"Parts of {len(incomplete)} split files are missing in the archive: {incomplete[:10]}")
+
+def _preallocate_file(file_name, size):
+    os.makedirs(path.dirname(file_name), exist_ok=True)
+    with open(file_name, 'wb') as f_id:
+        try:
+            os.posix_fallocate(f_id.fileno(), 0, size)
+        except (AttributeError, OSError):
+            pass
+        f_id.truncate(size)
+
+def _pwrite_all(fd, data, offset):
+    view = memoryview(data)
+    while view:
+        written = os.pwrite(fd, view, offset)
+        view = view[written:]
+        offset += written
+
+def _bounded_map(func, iterable, workers):
+    """
+    Runs func for every item of iterable in a thread pool,
+    keeping at most 2 * workers items in flight to bound memory usage.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for item in iterable:
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+            pending.add(pool.submit(func, item))
+        for future in pending:
+            future.result()
             
+@dataclasses.dataclass
+class SinaraArchivePlan:
+    """
+    Archive rows split by relPath ranges into partitions of about equal size ahead of packing,
+    every partition becomes a single parquet file of about BLOCK_SIZE bytes
+    """
+    partitions: list
+    block_size: int
+
+    @property
+    def sizes(self):
+        return [sum(chunk.length for chunk in partition) for partition in self.partitions]
+
+    def describe(self):
+        """
+        @return summary of the plan
+        """
+        sizes = self.sizes
+        return {
+            'partitions': len(self.partitions),
+            'rows': sum(len(partition) for partition in self.partitions),
+            'total_size': sum(sizes),
+            'min_partition_size': min(sizes) if sizes else 0,
+            'max_partition_size': max(sizes) if sizes else 0,
+            'block_size': self.block_size
+        }
+
 class SinaraArchive:
     """
     Provides effective way to store large files and pipeline entities in the SinaraML Storage.
@@ -41,17 +463,35 @@ class SinaraArchive:
 
     BLOCK_SIZE = get_block_size()
     ROW_SIZE = get_row_size()
+    UNPACK_WORKERS = get_unpack_workers()
+    CACHE_SIZE = get_cache_size()
+    # Chunks sampled and bytes per second of the storage writes assumed by 'auto' compression
+    AUTO_COMPRESSION_SAMPLES = 8
+    AUTO_COMPRESSION_WRITE_BANDWIDTH = 100 * 1024 * 1024
+
+    _cache = None
+    _chunk_cache = None
     
     def __init__(self, spark):
         self._spark = spark;
         
-    def pack_files_from_tmp_to_spark_df(self, tmp_entity_dir):
+    def pack_files_from_tmp_to_spark_df(self, tmp_entity_dir, zero_copy=False, checksum=None, checksums=None):
         """
         Packs files from temporary directory to the Apache Spark dataframe.
         @param tmp_entity_dir - temporary directory with files to pack
+        @param zero_copy - read rows straight from byte ranges of the original files
+                           instead of splitting large files into '.parts' directories first
+        @param checksum - algorithm of the 'checksum' column computed for every row, no column if None
+        @param checksums - Apache Spark accumulator of SinaraArchiveChecksums collecting the checksums of written rows
         @return Apache Spark dataframe
         """
 
+        if zero_copy:
+            return self._pack_chunks_to_spark_df(self._list_chunks(tmp_entity_dir), checksum=checksum, checksums=checksums)
+
+        from pyspark.sql.functions import regexp_replace, col, udf
+        from pyspark.sql.types import StringType
+
         tmp_url = tmp_entity_dir
         url = urlsplit(tmp_entity_dir)
         if not url.scheme:
@@ -59,21 +499,26 @@ class SinaraArchive:
 
         pathlist = [x for x in Path(tmp_entity_dir).glob(f'**/*') if not str(x.name).endswith(".parts") and not str(x.parent).endswith(".parts")]
         total_size = 0
-        for path in pathlist:
-            if Path(path).is_file():
-                total_size = total_size + Path(path).stat().st_size
-                if self.ROW_SIZE < Path(path).stat().st_size:
-                    self._split_file(path, self.ROW_SIZE)
-        cores = int(os.environ['SINARA_SERVER_CORES']) if 'SINARA_SERVER_CORES' in os.environ else 5
-        threads = cores * 3
-        partitions = int(total_size / self.BLOCK_SIZE) if int(total_size / self.BLOCK_SIZE) > threads else threads
+        for file_path in pathlist:
+            path_stat = file_path.stat()
+            if stat.S_ISREG(path_stat.st_mode):
+                total_size = total_size + path_stat.st_size
+                if self.ROW_SIZE < path_stat.st_size:
+                    self._split_file(file_path, self.ROW_SIZE)
+        partitions = self._partitions_count(total_size)
             
+        # the directory prefix is quoted, so metacharacters of its path are not taken as a regular expression
+        rel_path_prefix = '^\\Qfile:' + url.path.rstrip('/') + '\\E'
         df = self._spark.read.format("binaryFile").option("pathGlobFilter", "*").option("recursiveFileLookup", "true") \
                 .load(tmp_url) \
                 .filter(col('length') <= self.ROW_SIZE) \
-                .withColumn("relPath", regexp_replace('path', 'file:' + tmp_entity_dir, '')) \
+                .withColumn("relPath", regexp_replace('path', rel_path_prefix, '')) \
                 .drop("path")
-        return df.repartition(partitions)
+        if checksum:
+            checksum_udf = udf(partial(SinaraArchive_checksum_content, checksum=checksum, checksums=checksums), StringType())
+            df = df.withColumn('checksum', checksum_udf('content', 'relPath'))
+        # partitions are ranges of sorted relPath, so row group statistics let readers skip row groups on selective unpacking
+        return df.repartitionByRange(partitions, 'relPath').sortWithinPartitions('relPath')
 
     # Deprecate erroreneous method name
     def pack_files_form_tmp_to_spark_df(self, tmp_entity_dir):
@@ -83,42 +528,418 @@ class SinaraArchive:
         logging.warning("pack_files_form_tmp_to_spark_df method is deprecated, use pack_files_from_tmp_to_spark_df instead")
         return self.pack_files_from_tmp_to_spark_df(tmp_entity_dir)
     
-    def pack_files_from_tmp_to_store(self, tmp_entity_dir, store_path):
+    def pack_files_from_tmp_to_store(self, tmp_entity_dir, store_path, zero_copy=False, dedup=False, chunk_store_path=None,
+                                     compression=None, checksum=True):
         """
         Packs files from temporary directory to store.
         @param tmp_entity_dir - temporary directory with files to pack
         @param store_path - path in the configured SinaraML store
+        @param zero_copy - see pack_files_from_tmp_to_spark_df
+        @param dedup - write the deduplicating archive: a manifest in store_path referencing chunks by content hash,
+                       only chunks missing in the chunk store are written
+        @param chunk_store_path - chunk store of the deduplicating archive,
+                                  defaults to '.chunks' folder of the step the entity belongs to
+        @param compression - parquet codec: 'none', 'snappy', 'lz4', 'zstd' or 'zstd:<level>',
+                             'auto' picks the codec by compressing sampled chunks, Apache Spark default codec if None
+        @param checksum - store checksums of every row and of every file verified on unpacking:
+                          True for xxh64 if xxhash is installed or crc32 otherwise, algorithm name or False to skip,
+                          zero_copy computes them while content is read, packing from '.parts' directories in a Python UDF
         """
-        df = self.pack_files_from_tmp_to_spark_df(tmp_entity_dir)
-        df.write.option("parquet.block.size", self.BLOCK_SIZE).mode("overwrite").parquet(store_path)
+        compression = self._resolve_compression(compression, tmp_entity_dir)
+        if dedup:
+            self._pack_dedup(tmp_entity_dir, store_path, chunk_store_path or self._default_chunk_store_path(store_path), compression)
+            return
+        checksum = _resolve_checksum(checksum)
+        checksums = self._spark.sparkContext.accumulator({}, SinaraArchiveChecksums()) if checksum else None
+        df = self.pack_files_from_tmp_to_spark_df(tmp_entity_dir, zero_copy=zero_copy, checksum=checksum, checksums=checksums)
+        self._parquet_writer(df, compression).mode("overwrite").parquet(store_path)
+        archive_info = {}
+        if compression:
+            archive_info['compression'] = compression
+        file_checksums = None
+        if checksum:
+            archive_info['checksum'] = checksum
+            # checksums of rows are collected by the write job itself, the store is not read again
+            file_checksums = _file_checksums(checksums.value.items(), checksum)
+        if archive_info:
+            _write_archive_info(store_path, archive_info)
+        if zero_copy:
+            index_rows = self._list_chunks(tmp_entity_dir)
+        else:
+            # relPath of rows read by Apache Spark is derived from their urls, so the index takes the written values
+            index_rows = self._spark.read.parquet(store_path).select('relPath', 'length').collect()
+        _write_path_index(store_path, index_rows, file_checksums)
 
-    def pack(self, tmp_entity_dir, store_path):
-        self.pack_files_from_tmp_to_store(tmp_entity_dir, store_path)
+    def pack(self, tmp_entity_dir, store_path, zero_copy=False, dedup=False, chunk_store_path=None, compression=None,
+             checksum=True):
+        self.pack_files_from_tmp_to_store(tmp_entity_dir, store_path, zero_copy=zero_copy,
+                                          dedup=dedup, chunk_store_path=chunk_store_path, compression=compression,
+                                          checksum=checksum)
     
-    def unpack_files_from_spark_df_to_tmp(self, df_archive, tmp_entity_dir):
+    def unpack_files_from_spark_df_to_tmp(self, df_archive, tmp_entity_dir, streaming=False, checksum=None, expected_rows=None):
         """
         Unpacks files from the Apache Spark dataframe to the temporary directory
         @param df_archive - Apache Spark dataframe with archived files
         @param tmp_entity_dir - temporary directory with files to unpack
+        @param streaming - write chunks of split files straight to their offsets in the target files
+                           using UNPACK_WORKERS threads per partition instead of joining '.parts' directories
+        @param checksum - algorithm of the 'checksum' column, content of every row is verified before it is written
+        @param expected_rows - list of relPath and length of rows df_archive must have, e.g. from the path index,
+                               numbers of parts written by streaming are checked against them,
+                               or against the last part number of every split file if None
         """
-        df_archive.foreach(partial(SinaraArchive_save_file, tmp_entity_dir=tmp_entity_dir))
-        self._join_parts(tmp_entity_dir)
+        if streaming:
+            parts_layout, parts_counts = self._preallocate_parts(df_archive, tmp_entity_dir)
+            written_parts = df_archive.rdd.mapPartitions(partial(SinaraArchive_write_partition,
+                                                                 tmp_entity_dir=str(tmp_entity_dir),
+                                                                 parts_layout=parts_layout,
+                                                                 workers=self.UNPACK_WORKERS,
+                                                                 checksum=checksum)).collect()
+            _verify_written_parts(parts_counts if expected_rows is None else _parts_counts(expected_rows), written_parts)
+        else:
+            df_archive.foreach(partial(SinaraArchive_save_file, tmp_entity_dir=tmp_entity_dir, checksum=checksum))
+            self._join_parts(tmp_entity_dir)
     
-    def unpack_files_from_store_to_tmp(self, store_path, tmp_entity_dir):
+    def unpack_files_from_store_to_tmp(self, store_path, tmp_entity_dir, streaming=False, include=None):
         """
         Unpacks files from the store to the temporary directory
         @param store_path - path in the configured SinaraML store
         @param tmp_entity_dir - temporary directory with files to unpack
+        @param streaming - see unpack_files_from_spark_df_to_tmp
+        @param include - list of globs like 'model.cbm' or 'artifacts/*.json' matched against paths of files
+                         relative to the entity directory, only matching files are unpacked, all files if None
         """
+        archive_info = _read_archive_info(store_path)
+        if archive_info.get('format') == ARCHIVE_FORMAT_DEDUP:
+            self._unpack_dedup(store_path, archive_info['chunk_store'], tmp_entity_dir, include=include)
+            return
+        checksum = archive_info.get('checksum')
+        path_index = _read_path_index(store_path)
         df = self._spark.read.parquet(store_path)
-        self.unpack_files_from_spark_df_to_tmp(df, tmp_entity_dir)
+        if include is not None:
+            df = self._filter_included(df, path_index, include)
+        if path_index:
+            # only relPath and checksum columns are scanned to find missing rows before any file is written
+            rows = df.select('relPath', 'checksum') if checksum else df.select('relPath')
+            _verify_file_checksums(store_path, ((row.relPath, row.checksum if checksum else None) for row in rows.collect()),
+                                   path_index, checksum, include)
+        expected_rows = None
+        if path_index:
+            expected_rows = path_index['rows'] if include is None else _select_rows(path_index['rows'], include)
+        self.unpack_files_from_spark_df_to_tmp(df, tmp_entity_dir, streaming=streaming, checksum=checksum,
+                                               expected_rows=expected_rows)
 
-    def unpack(self, store_path):
-        path = Path(store_path)
+    def unpack(self, store_path, streaming=False, use_cache=False, include=None):
+        """
+        Unpacks files from the store to the temporary directory of the current run
+        @param store_path - path in the configured SinaraML store
+        @param streaming - see unpack_files_from_spark_df_to_tmp
+        @param use_cache - reuse files unpacked from the same unchanged store path before,
+                           files are hardlinked from the local cache and must not be modified
+        @param include - see unpack_files_from_store_to_tmp
+        @return temporary directory with unpacked files
+        """
         tmp_entity_dir = Path(get_tmp_work_path()) / Path(store_path).name
-        self.unpack_files_from_store_to_tmp(store_path, tmp_entity_dir)
+        if use_cache:
+            self._unpack_cached(store_path, tmp_entity_dir, streaming, include)
+        else:
+            self.unpack_files_from_store_to_tmp(store_path, tmp_entity_dir, streaming=streaming, include=include)
         return str(tmp_entity_dir)
+
+    def _filter_included(self, df_archive, path_index, include):
+        """
+        Filters archive rows of files matching include globs by the list of their relPath values.
+        Apache Spark pushes the filter down to the parquet scan, so row groups are skipped by relPath statistics.
+        Archives without the path index have their relPath column scanned to match globs.
+        """
+        from pyspark.sql.functions import col
+        rows = path_index['rows'] if path_index else None
+        if rows is None:
+            rows = [(row.relPath, row.length) for row in df_archive.select('relPath', 'length').collect()]
+        included = _select_rows(rows, include)
+        logging.info(f"{len(included)} of {len(rows)} archive rows match {include}")
+        df_included = df_archive.filter(col('relPath').isin([rel_path for rel_path, _ in included]))
+        if path_index and included and df_included.select('relPath').limit(1).count() == 0:
+            raise Exception(f"Rows of the path index matching {include} are not found in the archive, "
+                            f"relPath values of the index and of the archive differ")
+        return df_included
+
+    @staticmethod
+    def open(store_path, rel_path):
+        """
+        Opens a single file of the packed entity for reading without unpacking the entity,
+        chunks of the file are fetched lazily, so seek and partial reads transfer only chunks they touch.
+        Requires pyarrow, Apache Spark session is not used.
+        @param store_path - path in the configured SinaraML store
+        @param rel_path - path of the file relative to the entity directory
+        @return binary file-like object
+        """
+        from .arrow_archive import SinaraArchiveFile
+        return io.BufferedReader(SinaraArchiveFile(store_path, rel_path))
+
+    @staticmethod
+    def cache_stats():
+        """
+        @return hits, misses and evictions of the local unpack cache
+        """
+        return SinaraArchive._get_cache().stats.copy()
+
+    @staticmethod
+    def _get_cache():
+        if SinaraArchive._cache is None:
+            SinaraArchive._cache = SinaraLocalCache(f'{get_tmp_work_path(write_root=True)}/.archive_cache',
+                                                    SinaraArchive.CACHE_SIZE)
+        return SinaraArchive._cache
+
+    def _unpack_cached(self, store_path, tmp_entity_dir, streaming, include=None):
+        """
+        Unpacks the store path through the local cache keyed by the store path, include globs and size and mtime of its files.
+        Unpacking of the unchanged store path to the same directory again is a no-op.
+        """
+        fs = SinaraFileSystem.FileSystem()
+        store_files = sorted(fs.glob(f'{store_path}/*'))
+        key = SinaraLocalCache.make_key(str(store_path), include, [(x, fs.info(x)) for x in store_files])
+
+        cache = SinaraArchive._get_cache()
+        key_file = tmp_entity_dir.parent / f'.{tmp_entity_dir.name}.cache_key'
+        cache_path = cache.get(key)
+        if cache_path is None:
+            cache_path = cache.put(key, store_path,
+                                   lambda x: self.unpack_files_from_store_to_tmp(store_path, x, streaming=streaming, include=include))
+        elif key_file.is_file() and key_file.read_text() == key and tmp_entity_dir.is_dir():
+            return
+        cache.link(key, tmp_entity_dir)
+        key_file.write_text(key)
         
+    def plan(self, tmp_entity_dir):
+        """
+        Plans partitions of the zero-copy packing of the temporary directory without reading files content
+        @param tmp_entity_dir - temporary directory with files to pack
+        @return SinaraArchivePlan
+        """
+        return self._plan_chunks(self._list_chunks(tmp_entity_dir))
+
+    def _plan_chunks(self, chunks):
+        """
+        Splits chunks ordered by relPath into ceil(total_size / BLOCK_SIZE) contiguous ranges of about equal size,
+        so every partition covers a narrow range of relPath and row group statistics let selective unpacking skip
+        other partitions. A file is split between partitions only when its chunks span a partition boundary.
+        """
+        total_size = sum(chunk.length for chunk in chunks)
+        partitions_count = max(1, min(-(-total_size // self.BLOCK_SIZE), len(chunks)))
+        partitions = [[]]
+        planned_size = 0
+        for chunk in sorted(chunks, key=lambda x: x.relPath):
+            if partitions[-1] and len(partitions) < partitions_count and \
+                    planned_size >= total_size * len(partitions) / partitions_count:
+                partitions.append([])
+            partitions[-1].append(chunk)
+            planned_size += chunk.length
+        return SinaraArchivePlan(partitions=partitions, block_size=self.BLOCK_SIZE)
+
+    def _parallelize_plan(self, plan, func):
+        """
+        @return RDD with exactly one planned partition per Apache Spark partition, no shuffle is involved
+        """
+        return self._spark.sparkContext.parallelize(plan.partitions, len(plan.partitions)) \
+            .flatMap(partial(SinaraArchive_map_chunks, func=func))
+
+    def _parquet_writer(self, df, compression):
+        writer = df.write.option("parquet.block.size", self.BLOCK_SIZE)
+        if compression:
+            codec, level = _parse_compression(compression)
+            writer = writer.option("compression", codec)
+            if level is not None:
+                writer = writer.option("parquet.compression.codec.zstd.level", level)
+        return writer
+
+    def _resolve_compression(self, compression, tmp_entity_dir):
+        if compression is None:
+            return None
+        if str(compression).lower() == 'auto':
+            return self._select_compression(self._list_chunks(tmp_entity_dir))
+        codec, level = _parse_compression(compression)
+        return codec if level is None else f'{codec}:{level}'
+
+    def _select_compression(self, chunks):
+        """
+        Compresses evenly sampled chunks with every candidate codec and picks the one with the least estimated cost
+        of compression time plus time to write compressed bytes at AUTO_COMPRESSION_WRITE_BANDWIDTH.
+        'none' is picked for incompressible content.
+        """
+        import pyarrow as pa
+        chunks = [chunk for chunk in chunks if chunk.length > 0]
+        step = max(1, len(chunks) // self.AUTO_COMPRESSION_SAMPLES)
+        samples = [SinaraArchive_read_chunk(chunk)[2] for chunk in chunks[::step][:self.AUTO_COMPRESSION_SAMPLES]]
+        sample_size = sum(len(x) for x in samples)
+
+        best_compression = 'none'
+        best_cost = sample_size / self.AUTO_COMPRESSION_WRITE_BANDWIDTH
+        for compression in AUTO_COMPRESSION_CANDIDATES:
+            codec_name, level = _parse_compression(compression)
+            if not sample_size or not pa.Codec.is_available(codec_name):
+                continue
+            codec = pa.Codec(codec_name, compression_level=level)
+            start_time = time.perf_counter()
+            compressed_size = sum(codec.compress(x).size for x in samples)
+            elapsed = time.perf_counter() - start_time
+            cost = elapsed + compressed_size / self.AUTO_COMPRESSION_WRITE_BANDWIDTH
+            logging.info(f"Compression '{compression}': ratio {sample_size / max(compressed_size, 1):.2f}, "
+                         f"{sample_size / max(elapsed, 1e-9) / 1024 / 1024:.0f} MB/s")
+            if cost < best_cost:
+                best_compression, best_cost = compression, cost
+        logging.info(f"Compression '{best_compression}' is selected by sampling {len(samples)} chunks")
+        return best_compression
+
+    def _partitions_count(self, total_size):
+        cores = int(os.environ['SINARA_SERVER_CORES']) if 'SINARA_SERVER_CORES' in os.environ else 5
+        threads = cores * 3
+        return int(total_size / self.BLOCK_SIZE) if int(total_size / self.BLOCK_SIZE) > threads else threads
+
+    def _list_chunks(self, tmp_entity_dir):
+        """
+        Lists rows of the archive as byte ranges of files in the temporary directory.
+        Files larger than ROW_SIZE are described by the same '.parts/part-NNNN' rows as _split_file produces.
+        @return list of SinaraArchiveChunk
+        """
+        tmp_entity_dir = urlsplit(str(tmp_entity_dir)).path
+        chunks = []
+        for file_path in Path(tmp_entity_dir).glob('**/*'):
+            if file_path.name.endswith(".parts") or file_path.parent.name.endswith(".parts"):
+                continue
+            file_stat = file_path.stat()
+            if not stat.S_ISREG(file_stat.st_mode):
+                continue
+            rel_path = '/' + file_path.relative_to(tmp_entity_dir).as_posix()
+            if file_stat.st_size <= self.ROW_SIZE:
+                chunks.append(SinaraArchiveChunk(rel_path, str(file_path), 0, file_stat.st_size, file_stat.st_mtime))
+                continue
+            for part_num, offset in enumerate(range(0, file_stat.st_size, self.ROW_SIZE)):
+                chunks.append(SinaraArchiveChunk(f'{rel_path}.parts/part-{part_num:04d}', str(file_path), offset,
+                                                 min(self.ROW_SIZE, file_stat.st_size - offset), file_stat.st_mtime))
+            chunks.append(SinaraArchiveChunk(f'{rel_path}.parts/_PARTS', None, 0, 0, file_stat.st_mtime))
+        return chunks
+
+    def _pack_chunks_to_spark_df(self, chunks, checksum=None, checksums=None):
+        """
+        Creates the archive dataframe from chunk descriptors planned by _plan_chunks, content is read on the workers.
+        Checksums are computed on the workers while content is read.
+        """
+        from pyspark.sql.types import StructType, StructField, TimestampType, LongType, BinaryType, StringType
+        fields = [
+            StructField('modificationTime', TimestampType()),
+            StructField('length', LongType()),
+            StructField('content', BinaryType()),
+            StructField('relPath', StringType())
+        ]
+        if checksum:
+            fields.append(StructField('checksum', StringType()))
+        plan = self._plan_chunks(chunks)
+        logging.info(f"SinaraArchive plan: {plan.describe()}")
+        return self._spark.createDataFrame(self._parallelize_plan(plan, partial(SinaraArchive_read_chunk, checksum=checksum,
+                                                                                 checksums=checksums)),
+                                           StructType(fields))
+
+    def _default_chunk_store_path(self, store_path):
+        # store_path is <step_path>/<run_id>/<entity_name>
+        step_path = store_path.rstrip('/').rsplit('/', 2)[0]
+        return f'{step_path}/.chunks'
+
+    def _pack_dedup(self, tmp_entity_dir, store_path, chunk_store_path, compression=None):
+        """
+        Packs files as the manifest with 'modificationTime', 'length', 'relPath' and 'hash' columns.
+        Content of chunks is appended to the chunk store only for hashes the store doesn't contain yet.
+        """
+        chunks = self._list_chunks(tmp_entity_dir)
+        hashed_chunks = self._parallelize_plan(self._plan_chunks(chunks), SinaraArchive_hash_chunk).collect()
+
+        new_hashes = {chunk_hash for _, chunk_hash in hashed_chunks}
+        fs = SinaraFileSystem.FileSystem()
+        if new_hashes and fs.exists(chunk_store_path):
+            df_hashes = self._spark.createDataFrame([(x,) for x in new_hashes], 'hash string')
+            df_stored = self._spark.read.parquet(chunk_store_path).select('hash')
+            new_hashes = {row.hash for row in df_hashes.join(df_stored, 'hash', 'left_anti').collect()}
+
+        new_chunks = {}
+        for chunk, chunk_hash in hashed_chunks:
+            if chunk_hash in new_hashes:
+                new_hashes.discard(chunk_hash)
+                new_chunks[chunk] = chunk_hash
+        logging.info(f"{len(new_chunks)} of {len(hashed_chunks)} chunks are new for the chunk store '{chunk_store_path}'")
+
+        if new_chunks:
+            plan = self._plan_chunks(list(new_chunks))
+            hashed_plan = SinaraArchivePlan(partitions=[[(chunk, new_chunks[chunk]) for chunk in partition] for partition in plan.partitions],
+                                            block_size=plan.block_size)
+            rdd = self._parallelize_plan(hashed_plan, SinaraArchive_read_hashed_chunk)
+            df_chunks = self._spark.createDataFrame(rdd, 'hash string, length long, content binary') \
+                .sortWithinPartitions('hash')
+            self._parquet_writer(df_chunks, compression).mode("append").parquet(chunk_store_path)
+
+        manifest = [(datetime.fromtimestamp(chunk.modificationTime), chunk.length, chunk.relPath, chunk_hash)
+                    for chunk, chunk_hash in hashed_chunks]
+        self._spark.createDataFrame(manifest, 'modificationTime timestamp, length long, relPath string, hash string') \
+            .coalesce(1) \
+            .write.mode("overwrite").parquet(store_path)
+        archive_info = {'format': ARCHIVE_FORMAT_DEDUP, 'chunk_store': chunk_store_path}
+        if compression:
+            archive_info['compression'] = compression
+        _write_archive_info(store_path, archive_info)
+
+    def _unpack_dedup(self, store_path, chunk_store_path, tmp_entity_dir, include=None):
+        """
+        Unpacks the deduplicating archive. Chunks are taken from the local chunk cache by their hash,
+        only chunks missing there are fetched from the chunk store, verified against their hash and cached.
+        """
+        tmp_entity_dir = str(tmp_entity_dir)
+        manifest = self._spark.read.parquet(store_path).collect()
+        if include is not None:
+            included = {rel_path for rel_path, _ in _select_rows(((row.relPath, row.length) for row in manifest), include)}
+            manifest = [row for row in manifest if row.relPath in included]
+
+        parts_layout, file_sizes = _parts_layout((row.relPath, row.length) for row in manifest)
+        for file_name, size in file_sizes.items():
+            _preallocate_file(path.join(tmp_entity_dir, file_name), size)
+
+        chunk_cache = SinaraArchive._get_chunk_cache()
+        missing = []
+
+        def write_cached(row):
+            content = chunk_cache.get(row.hash)
+            if content is None:
+                missing.append(row)
+            else:
+                SinaraArchive_write_row(_SinaraArchiveChunkRow(row.relPath, content), tmp_entity_dir, parts_layout)
+
+        chunk_rows = [row for row in manifest if not row.relPath.endswith('.parts/_PARTS')]
+        _bounded_map(write_cached, chunk_rows, self.UNPACK_WORKERS)
+        logging.info(f"{len(missing)} of {len(chunk_rows)} chunks are fetched from the chunk store '{chunk_store_path}'")
+        if missing:
+            from pyspark.sql.functions import col
+
+            missing_hashes = list({row.hash for row in missing})
+            df_missing = self._spark.createDataFrame([(row.relPath, row.hash) for row in missing], 'relPath string, hash string')
+            df_chunks = self._spark.read.parquet(chunk_store_path) \
+                .filter(col('hash').isin(missing_hashes)) \
+                .dropDuplicates(['hash'])
+            df_missing.join(df_chunks, 'hash') \
+                .foreachPartition(partial(SinaraArchive_write_fetched_partition,
+                                          tmp_entity_dir=tmp_entity_dir,
+                                          parts_layout=parts_layout,
+                                          chunk_cache_dir=SinaraArchive._chunk_cache_dir(),
+                                          workers=self.UNPACK_WORKERS))
+        chunk_cache.evict()
+
+    @staticmethod
+    def _chunk_cache_dir():
+        return f'{get_tmp_work_path(write_root=True)}/.chunk_cache'
+
+    @staticmethod
+    def _get_chunk_cache():
+        if SinaraArchive._chunk_cache is None:
+            SinaraArchive._chunk_cache = SinaraChunkCache(SinaraArchive._chunk_cache_dir(), SinaraArchive.CACHE_SIZE)
+        return SinaraArchive._chunk_cache
+
     def _split_file(self, path, chunk_size):
         parts_path = Path(f"{path.parent}/{path.name}.parts")
         parts_path.mkdir(parents=False, exist_ok=True)
@@ -133,6 +954,27 @@ class SinaraArchive:
                     part_num = part_num + 1
         Path(f"{parts_path}/_PARTS").touch()
         
+    def _preallocate_parts(self, df_archive, tmp_entity_dir):
+        """
+        Creates every split file of the archive with its final size.
+        Only 'relPath' and 'length' columns are scanned, so no file content is read here.
+        @return dicts of chunk size and of number of parts up to the last one by relative path of every split file
+        """
+        from pyspark.sql.functions import col, regexp_extract, max as max_, sum as sum_
+        df_parts = df_archive.select(regexp_extract('relPath', PART_PATH_REGEX, 1).alias('filePath'),
+                                     regexp_extract('relPath', PART_PATH_REGEX, 2).alias('partNum'), 'length') \
+                .filter(col('filePath') != '') \
+                .groupBy('filePath') \
+                .agg(max_('length').alias('chunkSize'), sum_('length').alias('size'),
+                     max_(col('partNum').cast('int')).alias('lastPartNum'))
+        parts_layout = {}
+        parts_counts = {}
+        for row in df_parts.collect():
+            _preallocate_file(path.join(str(tmp_entity_dir), row.filePath), row.size)
+            parts_layout[row.filePath] = row.chunkSize
+            parts_counts[row.filePath] = row.lastPartNum + 1
+        return parts_layout, parts_counts
+        
     def _join_parts(self, path):
         parts_dirlist = [x for x in Path(path).glob('**/*.parts') if x.is_dir()]
         for parts_dir in parts_dirlist:
@@ -0,0 +1,402 @@
+import io
+import os
+import re
+import uuid
+import bisect
+import logging
+from collections import namedtuple, OrderedDict
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from .settings import _SinaraSettings
+from .archive import SinaraArchive, SinaraArchive_write_row, ARCHIVE_FORMAT_DEDUP, PART_PATH_REGEX, \
+    get_unpack_workers, _read_archive_info, _write_archive_info, _read_path_index, _write_path_index, _select_rows, \
+    _parse_compression, _parts_layout, _preallocate_file, _resolve_checksum, _checksum, _file_checksums, _verify_file_checksums
+
+# Minimal row of the archive consumed by SinaraArchive_write_row
+SinaraArrowArchiveRow = namedtuple('SinaraArrowArchiveRow', ['relPath', 'content', 'checksum'])
+
+def _arrow_schema(checksum=None):
+    import pyarrow as pa
+    fields = [
+        ('modificationTime', pa.timestamp('us', tz='UTC')),
+        ('length', pa.int64()),
+        ('content', pa.binary()),
+        ('relPath', pa.string())
+    ]
+    if checksum:
+        fields.append(('checksum', pa.string()))
+    return pa.schema(fields)
+
+def _arrow_filesystem(store_path):
+    from pyarrow import fs as pafs
+    url = urlsplit(str(store_path))
+    if url.scheme in ('s3', 's3a') and hasattr(_SinaraSettings, 'get_storage_s3_options'):
+        return _arrow_s3_filesystem(_SinaraSettings.get_storage_s3_options()), f'{url.netloc}{url.path}'
+    if url.scheme:
+        return pafs.FileSystem.from_uri(str(store_path))
+    return pafs.LocalFileSystem(), os.path.abspath(store_path)
+
+def _arrow_s3_filesystem(s3_options):
+    """
+    @return pyarrow S3FileSystem of the endpoint and credentials of the SinaraML storage,
+            the standard AWS environment is used for options not set
+    """
+    from pyarrow import fs as pafs
+    kwargs = {}
+    endpoint_url = s3_options.get('client_kwargs', {}).get('endpoint_url')
+    if endpoint_url:
+        endpoint = urlsplit(endpoint_url)
+        kwargs['endpoint_override'] = endpoint.netloc or endpoint.path
+        if endpoint.scheme:
+            kwargs['scheme'] = endpoint.scheme
+    if s3_options.get('key'):
+        kwargs['access_key'] = s3_options['key']
+        kwargs['secret_key'] = s3_options.get('secret')
+    return pafs.S3FileSystem(**kwargs)
+
+def _list_parquet_files(filesystem, base_path):
+    from pyarrow import fs as pafs
+    file_infos = filesystem.get_file_info(pafs.FileSelector(base_path, recursive=True))
+    return sorted(x.path for x in file_infos if x.is_file and not x.base_name.startswith(('_', '.')))
+
+class SinaraArrowArchive(SinaraArchive):
+    """
+    SinaraArchive engine built on pyarrow parquet writer and reader, works without Apache Spark session.
+    Archives have the same schema and chunking by ROW_SIZE, so they are interchangeable with SinaraArchive ones.
+    Deduplicating archives are not supported by this engine.
+    """
+
+    # parquet files are written and row groups are read by the thread pool of this size
+    WORKERS = get_unpack_workers()
+
+    def __init__(self):
+        super().__init__(None)
+
+    def pack_files_from_tmp_to_spark_df(self, tmp_entity_dir, zero_copy=False, checksum=None):
+        raise Exception("SinaraArrowArchive doesn't use Apache Spark dataframes, use pack_files_from_tmp_to_store instead")
+
+    def pack_files_from_tmp_to_store(self, tmp_entity_dir, store_path, zero_copy=True, dedup=False, chunk_store_path=None,
+                                     compression=None, checksum=True):
+        """
+        Packs files from temporary directory to store, every planned partition is written as a parquet file in parallel.
+        @param tmp_entity_dir - temporary directory with files to pack
+        @param store_path - path in the configured SinaraML store
+        @param zero_copy - files are always read by byte ranges, kept for compatibility with SinaraArchive
+        @param compression - see SinaraArchive.pack_files_from_tmp_to_store, pyarrow default codec if None
+        @param checksum - see SinaraArchive.pack_files_from_tmp_to_store
+        """
+        if dedup:
+            raise Exception("Deduplicating archives are not supported by SinaraArrowArchive")
+        compression = self._resolve_compression(compression, tmp_entity_dir)
+        checksum = _resolve_checksum(checksum)
+        plan = self.plan(tmp_entity_dir)
+        logging.info(f"SinaraArrowArchive plan: {plan.describe()}")
+
+        filesystem, base_path = _arrow_filesystem(store_path)
+        filesystem.create_dir(base_path, recursive=True)
+        filesystem.delete_dir_contents(base_path)
+        write_id = uuid.uuid4()
+        with ThreadPoolExecutor(max_workers=self.WORKERS) as pool:
+            written_rows = pool.map(lambda x: self._write_parquet_file(x[1], filesystem, f'{base_path}/part-{x[0]:05d}-{write_id}.parquet',
+                                                                       compression, checksum),
+                                    enumerate(plan.partitions))
+            written_rows = [row for rows in written_rows for row in rows]
+        archive_info = {}
+        if compression:
+            archive_info['compression'] = compression
+        if checksum:
+            archive_info['checksum'] = checksum
+        if archive_info:
+            _write_archive_info(store_path, archive_info)
+        _write_path_index(store_path, [chunk for partition in plan.partitions for chunk in partition],
+                          _file_checksums(written_rows, checksum) if checksum else None)
+        filesystem.open_output_stream(f'{base_path}/_SUCCESS').close()
+
+    def unpack_files_from_store_to_tmp(self, store_path, tmp_entity_dir, streaming=True, include=None):
+        """
+        Unpacks files from the store to the temporary directory, row groups are read and written in parallel.
+        Chunks of split files are always written straight to their offsets.
+        @param store_path - path in the configured SinaraML store
+        @param tmp_entity_dir - temporary directory with files to unpack
+        @param streaming - kept for compatibility with SinaraArchive
+        @param include - see SinaraArchive.unpack_files_from_store_to_tmp,
+                         row groups are skipped by min and max statistics of the relPath column
+        """
+        import pyarrow.parquet as pq
+        archive_info = _read_archive_info(store_path)
+        if archive_info.get('format') == ARCHIVE_FORMAT_DEDUP:
+            raise Exception("Deduplicating archives are not supported by SinaraArrowArchive")
+        checksum = archive_info.get('checksum')
+        tmp_entity_dir = str(tmp_entity_dir)
+        filesystem, base_path = _arrow_filesystem(store_path)
+
+        path_index = _read_path_index(store_path)
+        scan_rows = path_index is None
+        rows = [] if scan_rows else path_index['rows']
+        row_groups = []
+        for parquet_path in _list_parquet_files(filesystem, base_path):
+            parquet_file = pq.ParquetFile(parquet_path, filesystem=filesystem)
+            if scan_rows:
+                table = parquet_file.read(columns=['relPath', 'length'])
+                rows.extend(zip(table.column('relPath').to_pylist(), table.column('length').to_pylist()))
+            row_groups.extend((parquet_path, parquet_file.metadata, x) for x in range(parquet_file.num_row_groups))
+
+        rel_paths = None
+        if include is not None:
+            total_rows = len(rows)
+            rows = _select_rows(rows, include)
+            rel_paths = sorted(rel_path for rel_path, _ in rows)
+            row_groups = [x for x in row_groups if self._row_group_matches(x[1], x[2], rel_paths)]
+            logging.info(f"{len(rows)} of {total_rows} archive rows in {len(row_groups)} row groups match {include}")
+            rel_paths = set(rel_paths)
+
+        parts_layout, file_sizes = _parts_layout(rows)
+        for file_name, size in file_sizes.items():
+            _preallocate_file(os.path.join(tmp_entity_dir, file_name), size)
+
+        with ThreadPoolExecutor(max_workers=self.UNPACK_WORKERS) as pool:
+            written_rows = pool.map(partial(self._unpack_row_group, filesystem=filesystem, tmp_entity_dir=tmp_entity_dir,
+                                            parts_layout=parts_layout, rel_paths=rel_paths, checksum=checksum),
+                                    ((parquet_path, row_group_num) for parquet_path, _, row_group_num in row_groups))
+            written_rows = [row for rows in written_rows for row in rows]
+        _verify_file_checksums(store_path, written_rows, path_index, checksum, include)
+
+    def _pack_dedup(self, tmp_entity_dir, store_path, chunk_store_path, compression=None):
+        raise Exception("Deduplicating archives are not supported by SinaraArrowArchive")
+
+    def _write_parquet_file(self, chunks, filesystem, parquet_path, compression=None, checksum=None):
+        """
+        Writes chunks of the planned partition as row groups of about BLOCK_SIZE bytes
+        @return list of relPath and checksum of written rows
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        schema = _arrow_schema(checksum)
+        written_rows = []
+        codec, level = _parse_compression(compression) if compression else ('snappy', None)
+        with pq.ParquetWriter(parquet_path, schema, filesystem=filesystem, compression=codec, compression_level=level) as writer:
+            batch = []
+            batch_size = 0
+            for chunk in chunks + [None]:
+                if batch and (chunk is None or batch_size + chunk.length > self.BLOCK_SIZE):
+                    writer.write_table(pa.Table.from_pylist(batch, schema=schema), row_group_size=len(batch))
+                    batch = []
+                    batch_size = 0
+                if chunk is None:
+                    break
+                content = b''
+                if chunk.length > 0:
+                    with open(chunk.path, 'rb') as f_id:
+                        content = os.pread(f_id.fileno(), chunk.length, chunk.offset)
+                row = {
+                    'modificationTime': int(chunk.modificationTime * 1000000),
+                    'length': len(content),
+                    'content': content,
+                    'relPath': chunk.relPath
+                }
+                if checksum:
+                    row['checksum'] = _checksum(content, checksum)
+                    written_rows.append((chunk.relPath, row['checksum']))
+                batch.append(row)
+                batch_size += len(content)
+        return written_rows
+
+    def _unpack_row_group(self, row_group, filesystem, tmp_entity_dir, parts_layout, rel_paths=None, checksum=None):
+        """
+        Writes rows of the row group verifying their checksums
+        @return list of relPath and checksum of written rows
+        """
+        import pyarrow.parquet as pq
+        parquet_path, row_group_num = row_group
+        columns = ['relPath', 'content', 'checksum'] if checksum else ['relPath', 'content']
+        table = pq.ParquetFile(parquet_path, filesystem=filesystem).read_row_group(row_group_num, columns=columns)
+        checksums = table.column('checksum').to_pylist() if checksum else [None] * table.num_rows
+        written_rows = []
+        for row in zip(table.column('relPath').to_pylist(), table.column('content').to_pylist(), checksums):
+            if rel_paths is None or row[0] in rel_paths:
+                SinaraArchive_write_row(SinaraArrowArchiveRow._make(row), tmp_entity_dir, parts_layout, checksum=checksum)
+                written_rows.append((row[0], row[2]))
+        return written_rows
+
+    def _row_group_matches(self, metadata, row_group_num, rel_paths):
+        """
+        @param rel_paths - sorted list of relPath values to unpack
+        @return False if min and max statistics of the relPath column prove the row group has none of rel_paths
+        """
+        return _row_group_matches(metadata, row_group_num, 'relPath', rel_paths)
+
+def _row_group_matches(metadata, row_group_num, column_name, values):
+    """
+    @param values - sorted list of values of the column
+    @return False if min and max statistics of the column prove the row group has none of values
+    """
+    statistics = metadata.row_group(row_group_num).column(metadata.schema.names.index(column_name)).statistics
+    if statistics is None or not statistics.has_min_max:
+        return True
+    pos = bisect.bisect_left(values, statistics.min)
+    return pos < len(values) and values[pos] <= statistics.max
+
+class SinaraArchiveFile(io.RawIOBase):
+    """
+    Read-only seekable file of the packed SinaraArchive entity.
+    Chunk rows of the file are fetched on read from row groups found by statistics of the lookup key column,
+    every row group is read once and all chunks of the file it has are kept in memory up to READ_CACHE_SIZE bytes.
+    """
+
+    # Bytes of decoded chunks of the file kept in memory, least recently read ones are dropped first
+    READ_CACHE_SIZE = 256 * 1024 * 1024
+
+    def __init__(self, store_path, rel_path):
+        """
+        @param store_path - path of the packed entity in the configured SinaraML store
+        @param rel_path - path of the file relative to the entity directory
+        """
+        import pyarrow.parquet as pq
+        super().__init__()
+        self._store_path = store_path
+        self._rel_path = rel_path.strip('/')
+        archive_info = _read_archive_info(store_path)
+        filesystem, base_path = _arrow_filesystem(store_path)
+
+        if archive_info.get('format') == ARCHIVE_FORMAT_DEDUP:
+            # content of the deduplicating archive is looked up in the chunk store by hash
+            manifest = pq.read_table(base_path, filesystem=filesystem, columns=['relPath', 'length', 'hash'])
+            rows = zip(manifest.column('relPath').to_pylist(), manifest.column('length').to_pylist(),
+                       manifest.column('hash').to_pylist())
+            self._key_column = 'hash'
+            self._filesystem, self._data_path = _arrow_filesystem(archive_info['chunk_store'])
+        else:
+            path_index = _read_path_index(store_path)
+            rows = path_index['rows'] if path_index else None
+            if rows is None:
+                rows = []
+                for parquet_path in _list_parquet_files(filesystem, base_path):
+                    table = pq.ParquetFile(parquet_path, filesystem=filesystem).read(columns=['relPath', 'length'])
+                    rows.extend(zip(table.column('relPath').to_pylist(), table.column('length').to_pylist()))
+            rows = ((rel_path, length, rel_path) for rel_path, length in rows)
+            self._key_column = 'relPath'
+            self._filesystem, self._data_path = filesystem, base_path
+
+        chunks = self._file_chunks(rows)
+        if chunks is None:
+            raise Exception(f"There is no file '{rel_path}' in the archive '{store_path}'")
+        self._keys = [key for key, _ in chunks]
+        self._offsets = [0]
+        for _, length in chunks:
+            self._offsets.append(self._offsets[-1] + length)
+        self._size = self._offsets[-1]
+        self._pos = 0
+        # row groups which may have the chunk by its key, found on the first read
+        self._chunk_row_groups = None
+        self._read_row_groups = set()
+        # decoded chunks by key and the row group they were read from
+        self._contents = OrderedDict()
+        self._contents_size = 0
+
+    def _file_chunks(self, rows):
+        """
+        @param rows - iterable of relPath, length and lookup key of archive rows
+        @return lookup keys and lengths of chunks of the file in the order of their offsets or None if there is no such file
+        """
+        parts = {}
+        for rel_path, length, key in rows:
+            if rel_path.strip('/') == self._rel_path:
+                return [(key, length)]
+            part = re.match(PART_PATH_REGEX, rel_path)
+            if part and part.group(1) == self._rel_path:
+                parts[int(part.group(2))] = (key, length)
+        if not parts:
+            return None
+        return [parts[part_num] for part_num in sorted(parts)]
+
+    def _chunk_content(self, chunk_num):
+        key = self._keys[chunk_num]
+        if key in self._contents:
+            self._contents.move_to_end(key)
+            return self._contents[key][0]
+        if self._chunk_row_groups is None:
+            self._chunk_row_groups = self._find_chunk_row_groups()
+        for row_group in self._chunk_row_groups.get(key, []):
+            if row_group in self._read_row_groups:
+                continue
+            self._read_row_group(row_group)
+            if key in self._contents:
+                return self._contents[key][0]
+        raise Exception(f"Chunk '{key}' of the file '{self._rel_path}' is missing in the archive '{self._store_path}'")
+
+    def _find_chunk_row_groups(self):
+        """
+        @return dict of row groups (parquet path, row group number) by chunk key,
+                row groups whose min and max statistics of the key column don't cover the key are left out
+        """
+        import pyarrow.parquet as pq
+        keys = sorted(set(self._keys))
+        chunk_row_groups = {key: [] for key in keys}
+        for parquet_path in _list_parquet_files(self._filesystem, self._data_path):
+            metadata = pq.ParquetFile(parquet_path, filesystem=self._filesystem).metadata
+            column_num = metadata.schema.names.index(self._key_column)
+            for row_group_num in range(metadata.num_row_groups):
+                statistics = metadata.row_group(row_group_num).column(column_num).statistics
+                if statistics is None or not statistics.has_min_max:
+                    matching_keys = keys
+                else:
+                    matching_keys = keys[bisect.bisect_left(keys, statistics.min):bisect.bisect_right(keys, statistics.max)]
+                for key in matching_keys:
+                    chunk_row_groups[key].append((parquet_path, row_group_num))
+        return chunk_row_groups
+
+    def _read_row_group(self, row_group):
+        """
+        Reads the row group keeping all chunks of the file it has
+        """
+        import pyarrow.parquet as pq
+        parquet_path, row_group_num = row_group
+        table = pq.ParquetFile(parquet_path, filesystem=self._filesystem) \
+            .read_row_group(row_group_num, columns=[self._key_column, 'content'])
+        self._read_row_groups.add(row_group)
+        keys = set(self._keys)
+        for key, content in zip(table.column(self._key_column).to_pylist(), table.column('content').to_pylist()):
+            if key in keys and key not in self._contents:
+                self._contents[key] = (content, row_group)
+                self._contents_size += len(content)
+        while self._contents_size > self.READ_CACHE_SIZE and len(self._contents) > 1:
+            _, (content, evicted_row_group) = self._contents.popitem(last=False)
+            self._contents_size -= len(content)
+            # the row group is read again if the dropped chunk is needed
+            self._read_row_groups.discard(evicted_row_group)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self._size + offset
+        else:
+            raise ValueError(f"Unexpected whence {whence}")
+        if pos < 0:
+            raise ValueError(f"Negative seek position {pos}")
+        self._pos = pos
+        return self._pos
+
+    def readinto(self, buffer):
+        if self._pos >= self._size:
+            return 0
+        chunk_num = bisect.bisect_right(self._offsets, self._pos) - 1
+        content = self._chunk_content(chunk_num)
+        start = self._pos - self._offsets[chunk_num]
+        size = min(len(buffer), len(content) - start)
+        buffer[:size] = content[start:start + size]
+        self._pos += size
+        return size
@@ -1,6 +1,9 @@
 from ..fs import SinaraFileSystem
-from ..substep import get_curr_run_id, get_curr_notebook_name
-from .utils import process_artifacts_archive, process_service_version, save_bentoservice_profile
+from ..settings import _SinaraSettings
+from ..cache import SinaraLocalCache
+from ..substep import get_curr_run_id, get_curr_notebook_name, get_tmp_work_path
+from .dependencies import PipDependencyResolver
+from .utils import process_artifacts_archive, process_service_version, save_bentoservice_profile, write_zip, ZIP_STORED_EXTENSIONS
 import os
 import shutil
 from pathlib import Path
@@ -11,6 +14,12 @@ import bentoml
 import json
 import yaml
 import re
+import struct
+import zipfile
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
 from subprocess import STDOUT, PIPE, DEVNULL, run, Popen
 import dataclasses
 
@@ -24,49 +33,89 @@ import dataclasses
 def get_sinara_step_tmp_path():
     return f"{os.getcwd()}/tmp"
 
+def get_bentoservice_cache_size():
+    if hasattr(_SinaraSettings, 'get_bentoservice_cache_size'):
+        return _SinaraSettings.get_bentoservice_cache_size()
+    else:
+        return 10 * 1024 * 1024 * 1024
+
+def get_extract_workers():
+    if hasattr(_SinaraSettings, 'get_storage_unpack_workers'):
+        return _SinaraSettings.get_storage_unpack_workers()
+    else:
+        return 4
+
+# Members of model.zip stored uncompressed and larger than this are extracted by parallel ranged reads
+EXTRACT_PART_SIZE = 64 * 1024 * 1024
+
+# sha256 of model.zip written next to it by save_bentoservice, part of the bundle cache key
+MODEL_ZIP_HASH_FILE_NAME = 'model.zip.sha256'
+# Number of BentoService objects kept loaded in the kernel by load_bentoservice
+LOADED_BENTOSERVICES_SIZE = 4
+
+_bundle_cache = None
+_loaded_bentoservices = OrderedDict()
+_loaded_bentoservices_lock = threading.Lock()
+
+class _HashingWriter:
+    """
+    Write-only file object computing sha256 of the data written through it
+    """
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+        self.sha256 = hashlib.sha256()
+
+    def write(self, data):
+        self.sha256.update(data)
+        return self._fileobj.write(data)
+
+    def flush(self):
+        self._fileobj.flush()
+
+
+_pip_dependency_resolver = None
+
+def _get_pip_dependency_resolver():
+    global _pip_dependency_resolver
+    if _pip_dependency_resolver is None:
+        _pip_dependency_resolver = PipDependencyResolver(f'{get_tmp_work_path(write_root=True)}/.pip_dependencies_cache.json')
+    return _pip_dependency_resolver
 
 def _infer_pip_dependencies(bentoservice_dir):
-    requirements = []
+    """
+    Adds pinned transitive dependencies of requirements.txt packages to requirements.txt and bentoml.yml
+    """
     with open(Path(bentoservice_dir) / 'requirements.txt', 'r') as f:
-        requirements = f.read().splitlines()
-
-    add_requirements = []
-    for package_name in requirements:
-        #remove version from package name
-        package_name = re.sub(r'(==|>|<)([\S]+)', '', package_name)
-
-        from pip._vendor import pkg_resources
-        package = pkg_resources.working_set.by_key[package_name]
-        #print([str(r) for r in package.requires()])  # retrieve deps from setup.py
-        for required_package_name in package.requires():
-            required_package_name = re.sub(r'(==|>|<)([\S ]+)', '', str(required_package_name))
-            from importlib.metadata import version
-            required_package_name = f"{required_package_name}=={version(required_package_name)}"
-            add_requirements.append(required_package_name)
+        requirements = [x.strip() for x in f.read().splitlines()]
+    requirements = [x for x in requirements if x and not x.startswith(('#', '-'))]
+
+    with open(Path(bentoservice_dir) / 'bentoml.yml', 'r') as f:
+        bentoml_info = yaml.safe_load(f)
+    pip_packages = bentoml_info['env']['pip_packages']
+
+    resolver = _get_pip_dependency_resolver()
+    listed_names = {resolver.requirement_name(x) for x in requirements + pip_packages}
+    add_requirements = [x for x in resolver.resolve(requirements) if resolver.requirement_name(x) not in listed_names]
 
     with open(Path(bentoservice_dir) / 'requirements.txt', 'a') as f:
-        for i in set(add_requirements):
+        for i in add_requirements:
             f.write(i)
             f.write('\n')
 
-    bentoml_info = None
-    with open(Path(bentoservice_dir) / 'bentoml.yml', 'r') as f:
-        bentoml_info = yaml.safe_load(f)
-        for i in set(add_requirements):
-            bentoml_info['env']['pip_packages'].append(i)
-
-    if not bentoml_info is None:
-        with open(Path(bentoservice_dir) / 'bentoml.yml', 'w') as file:
-            yaml.dump(bentoml_info, file)
+    pip_packages += add_requirements
+    with open(Path(bentoservice_dir) / 'bentoml.yml', 'w') as file:
+        yaml.dump(bentoml_info, file)
 
 
-def save_bentoservice( bentoservice, *, substep = None, path, service_version = None, infer_additional_pip_dependencies = False):
+def save_bentoservice( bentoservice, *, substep = None, path, service_version = None, infer_additional_pip_dependencies = False,
+                       zip_stored_extensions = ZIP_STORED_EXTENSIONS):
     """
     Save to model packed as a BentoService Python object to the file system
     @param bentoservice: bentoml.BentoService
     @param substep: NotebookSubstep
     @param path: str
     @param service_version: Optional[str]
+    @param zip_stored_extensions: files with these extensions are stored in model.zip uncompressed, pass () to deflate all
     """
     # Correct 'ensure_python' method in bentoml-init.sh
     def fix_bentoml_013_2(filepath):
@@ -138,43 +187,105 @@ def save_bentoservice( bentoservice, *, substep = None, path, service_version =
     if hasattr(bentoservice, 'service_profile'):
         save_bentoservice_profile(bentoservice_dir, bentoservice.service_profile)
         shutil.copytree("sinara/bentoservice", f"{bentoservice_dir}/ModelService/sinara/bentoservice")
-    
-    #make zip file for bento service
-    bentoservice_zipfile =  f"{tmppath}/{runid}_{bentoservice_name}.model" 
-    shutil.make_archive(bentoservice_zipfile, 'zip', bentoservice_dir)
 
-    #write zip file to fs
+    _copy_microbatch_module(bentoservice_dir, bentoservice.name)
     
+    #stream zip of bento service to fs, no intermediate zip file in tmp
     fs = SinaraFileSystem.FileSystem()
     fs.makedirs(fspath)
-    fs.put(f"{bentoservice_zipfile}.zip", f"{fspath}/model.zip")
+    with fs.open(f"{fspath}/model.zip", 'wb') as f:
+        hashing_writer = _HashingWriter(f)
+        write_zip(bentoservice_dir, hashing_writer, zip_stored_extensions)
+    with fs.open(f"{fspath}/{MODEL_ZIP_HASH_FILE_NAME}", 'wb') as f:
+        f.write(hashing_writer.sha256.hexdigest().encode())
     fs.touch(f"{fspath}/_SUCCESS")
     
-    #remove zip file from tmp
-    os.remove(f"{bentoservice_zipfile}.zip")
-    
-def load_bentoservice(path, bentoservice_name: str = None):
+def _copy_microbatch_module(bentoservice_dir, bentoservice_name):
+    """
+    predict of services may batch requests by sinara.bentoservice.microbatch, which bentoml doesn't copy
+    to the bundle unless the service has a profile, so the module is copied to every bundle
+    """
+    bundle_module_dir = Path(bentoservice_dir, bentoservice_name, 'sinara', 'bentoservice')
+    if (bundle_module_dir / 'microbatch.py').exists():
+        return
+    os.makedirs(bundle_module_dir, exist_ok=True)
+    shutil.copy(Path(__file__).parent.parent / 'bentoservice' / 'microbatch.py', bundle_module_dir / 'microbatch.py')
+
+def load_bentoservice(path, bentoservice_name: str = None, use_cache = False):
     """
     Load model packed as a BentoService Python object from the file system
     @param bentoservice_name - name of the loading BentoService
     @param path: str
+    @param use_cache - reuse the bundle unpacked before from the same unchanged model.zip and the BentoService loaded
+                       in this kernel, the returned BentoService is shared between callers and bundle files
+                       are hardlinked from the local cache, so neither must be modified
     """
-    # read zip file from dir
     runid = get_curr_run_id()
     if bentoservice_name is None:
         bentoservice_name = os.path.basename(path)
     tmppath = get_sinara_step_tmp_path()
-    bentoservice_zipfile =  f"{tmppath}/{runid}_{bentoservice_name}.model.zip"
-    bentoservice_zipfile_crc = f"{tmppath}/.{runid}_{bentoservice_name}.model.zip.crc"
+    bentoservice_dir = f"{tmppath}/{runid}/{bentoservice_name}"
     
     fs = SinaraFileSystem.FileSystem()
     if not fs.exists(f"{path}/_SUCCESS"):
         raise Exception("There is no _SUCCESS file for '{path}'")
-    
+
+    if not use_cache:
+        _unpack_bentoservice(path, bentoservice_dir)
+        return bentoml.load_from_dir(bentoservice_dir)
+
+    key = _bundle_cache_key(path)
+    cache = _get_bundle_cache()
+    if cache.get(key) is None:
+        cache.put(key, path, lambda x: _unpack_bentoservice(path, x))
+    # the bundle is expected in the tmp dir of the run even if the BentoService is already loaded
+    cache.link(key, bentoservice_dir)
+
+    with _loaded_bentoservices_lock:
+        if key in _loaded_bentoservices:
+            _loaded_bentoservices.move_to_end(key)
+            logging.info(f"BentoService '{path}' is already loaded")
+            return _loaded_bentoservices[key]
+
+    #load bentoml service
+    bentoservice = bentoml.load_from_dir(bentoservice_dir)
+    with _loaded_bentoservices_lock:
+        _loaded_bentoservices[key] = bentoservice
+        while len(_loaded_bentoservices) > LOADED_BENTOSERVICES_SIZE:
+            _loaded_bentoservices.popitem(last=False)
+    return bentoservice
+
+def _get_bundle_cache():
+    global _bundle_cache
+    if _bundle_cache is None:
+        _bundle_cache = SinaraLocalCache(f'{get_tmp_work_path(write_root=True)}/.bentoservice_cache', get_bentoservice_cache_size())
+    return _bundle_cache
+
+def _bundle_cache_key(path):
+    """
+    @return key of the bundle by the path and size, mtime and sha256 of its model.zip
+    """
+    fs = SinaraFileSystem.FileSystem()
+    model_zip_hash = None
+    if fs.exists(f"{path}/{MODEL_ZIP_HASH_FILE_NAME}"):
+        with fs.open(f"{path}/{MODEL_ZIP_HASH_FILE_NAME}") as f:
+            model_zip_hash = f.read().decode()
+    return SinaraLocalCache.make_key(str(path), fs.info(f"{path}/model.zip"), model_zip_hash)
+
+def _unpack_bentoservice(path, bentoservice_dir):
+    """
+    Copies model.zip of the path to tmp and unpacks it to bentoservice_dir
+    """
+    runid = get_curr_run_id()
+    tmppath = get_sinara_step_tmp_path()
+    bentoservice_zipfile =  f"{tmppath}/{runid}_{os.path.basename(path)}.model.zip"
+    bentoservice_zipfile_crc = f"{tmppath}/.{runid}_{os.path.basename(path)}.model.zip.crc"
+
+    fs = SinaraFileSystem.FileSystem()
     fs.get(f"{path}/model.zip", bentoservice_zipfile)
-    
-    # unpack zip archive   
-    bentoservice_dir = f"{tmppath}/{runid}/{bentoservice_name}"
+
+    # unpack zip archive
+    shutil.rmtree(bentoservice_dir, ignore_errors=True)
     shutil.unpack_archive(bentoservice_zipfile, bentoservice_dir)
         
     # remove zip file from tmp
@@ -183,9 +294,6 @@ def load_bentoservice(path, bentoservice_name: str = None):
         os.remove(bentoservice_zipfile_crc)
     except:
         pass #crc file doesn't exisis
-    
-    #load bentoml service
-    return bentoml.load_from_dir(bentoservice_dir)
 
 def start_dev_bentoservice( bentoservice, use_popen = False, debug = False, port = 5000 ):
     """
@@ -238,6 +346,46 @@ def stop_dev_bentoservice(bentoservice):
     """
     bentoservice.stop_dev_server()
 
+def load_test_bentoservice(data, *, apis = ('predict', 'predict_unbatched'), port = 5000, concurrency = 16,
+                           requests_count = 500, rows_per_request = 1):
+    """
+    Load test of BentoService APIs started by start_dev_bentoservice, e.g. micro-batched predict against predict_unbatched
+    @param data: pandas DataFrame, requests take its rows in turn
+    @param apis: names of DataframeInput APIs to test one after another
+    @param port: BentoService port number
+    @param concurrency: number of concurrent clients
+    @param requests_count: number of requests to every API
+    @param rows_per_request: number of data rows in every request
+    @return dict of 'p50', 'p99' latencies in ms and 'rps' of every API
+    """
+    payloads = [data.iloc[i % len(data):i % len(data) + rows_per_request].to_json(orient='records')
+                for i in range(0, requests_count * rows_per_request, rows_per_request)]
+    report = {}
+    for api_name in apis:
+        url = f"http://127.0.0.1:{port}/{api_name}"
+        session = threading.local()
+
+        def send(payload):
+            if not hasattr(session, 'http'):
+                session.http = requests.Session()
+            start = time.perf_counter()
+            response = session.http.post(url, data=payload, headers={'Content-Type': 'application/json'})
+            response.raise_for_status()
+            return (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = sorted(pool.map(send, payloads))
+        duration = time.perf_counter() - start
+        report[api_name] = {
+            'p50': latencies[int(0.50 * (len(latencies) - 1))],
+            'p99': latencies[int(0.99 * (len(latencies) - 1))],
+            'rps': len(latencies) / duration
+        }
+        print(f"{api_name}: p50 {report[api_name]['p50']:.1f} ms, p99 {report[api_name]['p99']:.1f} ms, "
+              f"{report[api_name]['rps']:.0f} requests/s")
+    return report
+
 def save_bentoartifact_to_tmp(bentoservice, 
                                artifact_name="model", 
                                artifact_file_path=""):
@@ -254,46 +402,100 @@ def save_bentoartifact_to_tmp(bentoservice,
     
     bentoservice.artifacts[artifact_name].save(artifact_file_path)
     
-def extract_artifacts_from_bentoservice(bentoservice_path, dest_folder=None):
+def extract_artifacts_from_bentoservice(bentoservice_path, dest_folder=None, artifact_names=None, workers=None):
     """
     Extracting BentoService Artifacts
+    Only bentoml.yml and members of <service_name>/artifacts are read from model.zip, nothing else is unpacked
     @param bentoservice_path: path to the BentoService zip file
     @dest_folder: extracted artifacts destination folder
+    @param artifact_names: names of artifacts to extract, e.g. 'model' for 'model.onnx', all artifacts if None
+    @param workers: number of members and ranges of large uncompressed members extracted in parallel
     """
-    # read zip file from dir
     runid = get_curr_run_id()
     bentoservice_name = os.path.basename(bentoservice_path)
     tmppath = get_sinara_step_tmp_path()
-    bentoservice_zipfile =  f"{tmppath}/{runid}_{bentoservice_name}.model.zip"
-    bentoservice_zipfile_crc = f"{tmppath}/.{runid}_{bentoservice_name}.model.zip.crc"
     
     fs = SinaraFileSystem.FileSystem()
     if not fs.exists(f"{bentoservice_path}/_SUCCESS"):
         raise Exception("There is no _SUCCESS file for '{path}'")
     
-    fs.get(f"{bentoservice_path}/model.zip", bentoservice_zipfile)
-    
-    # unpack zip archive   
     bentoservice_dir = f"{tmppath}/{runid}/{bentoservice_name}"
     unpack_dest_folder = dest_folder if dest_folder else bentoservice_dir
-    unpack_dest_folder_tmp = Path(unpack_dest_folder) / '_tmp'
-    
-    shutil.unpack_archive(bentoservice_zipfile, unpack_dest_folder_tmp )
-    
-    bentoml_yaml = Path(unpack_dest_folder_tmp) / "bentoml.yml"
-    with open(bentoml_yaml, 'r') as f:
-        bentoml_info = yaml.safe_load(f)
-        
-    artifacts_folder = Path(unpack_dest_folder_tmp) / bentoml_info['metadata']['service_name'] / 'artifacts'
+    artifacts_folder = Path(unpack_dest_folder) / 'artifacts'
+    model_zip = f"{bentoservice_path}/model.zip"
 
-    shutil.move(src=artifacts_folder, dst=unpack_dest_folder)
-    shutil.rmtree(unpack_dest_folder_tmp)
+    with fs.open(model_zip) as f, zipfile.ZipFile(f) as zip_file:
+        bentoml_info = yaml.safe_load(zip_file.read('bentoml.yml'))
+        artifacts_prefix = f"{bentoml_info['metadata']['service_name']}/artifacts/"
+        members = [x for x in zip_file.infolist()
+                   if x.filename.startswith(artifacts_prefix) and
+                   _is_artifact_member(x.filename[len(artifacts_prefix):], artifact_names)]
+
+    shutil.rmtree(artifacts_folder, ignore_errors=True)
+    artifacts_folder.mkdir(parents=True)
+    tasks = []
+    for member in members:
+        member_path = artifacts_folder / member.filename[len(artifacts_prefix):]
+        if member.is_dir():
+            member_path.mkdir(parents=True, exist_ok=True)
+            continue
+        member_path.parent.mkdir(parents=True, exist_ok=True)
+        if member.compress_type == zipfile.ZIP_STORED and member.file_size > EXTRACT_PART_SIZE:
+            with open(member_path, 'wb') as f:
+                f.truncate(member.file_size)
+            tasks += [(member, member_path, offset) for offset in range(0, member.file_size, EXTRACT_PART_SIZE)]
+        else:
+            tasks.append((member, member_path, None))
+
+    # every thread reads model.zip by its own file object, as zip reads seek it
+    local = threading.local()
+    opened_files = []
+    opened_files_lock = threading.Lock()
+
+    def extract(task):
+        member, member_path, offset = task
+        if not hasattr(local, 'zip_file'):
+            local.f = fs.open(model_zip)
+            local.zip_file = zipfile.ZipFile(local.f)
+            with opened_files_lock:
+                opened_files.append((local.zip_file, local.f))
+        if offset is None:
+            with local.zip_file.open(member) as src, open(member_path, 'wb') as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+        else:
+            _extract_stored_range(local.f, member, member_path, offset)
 
-    # remove zip file from tmp
-    os.remove(bentoservice_zipfile)
     try:
-        os.remove(bentoservice_zipfile_crc)
-    except:
-        pass #crc file doesn't exisis
-    
+        with ThreadPoolExecutor(max_workers=workers or get_extract_workers()) as pool:
+            list(pool.map(extract, tasks))
+    finally:
+        for zip_file, f in opened_files:
+            zip_file.close()
+            f.close()
+
     return unpack_dest_folder
+
+def _is_artifact_member(rel_path, artifact_names):
+    if artifact_names is None:
+        return True
+    artifact_file_name = rel_path.split('/')[0]
+    return any(artifact_file_name == x or artifact_file_name.startswith(f'{x}.') for x in artifact_names)
+
+def _extract_stored_range(f, member, member_path, offset):
+    """
+    Copies the range of EXTRACT_PART_SIZE bytes at offset of the uncompressed member to the preallocated file
+    """
+    # member data follows its local header: 30 bytes, file name and extra field of lengths at header bytes 26-30
+    f.seek(member.header_offset)
+    name_length, extra_length = struct.unpack('<HH', f.read(30)[26:30])
+    f.seek(member.header_offset + 30 + name_length + extra_length + offset)
+    data = f.read(min(EXTRACT_PART_SIZE, member.file_size - offset))
+    fd = os.open(member_path, os.O_WRONLY)
+    try:
+        view = memoryview(data)
+        while view:
+            written = os.pwrite(fd, view, offset)
+            view = view[written:]
+            offset += written
+    finally:
+        os.close(fd)
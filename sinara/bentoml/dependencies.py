@@ -0,0 +1,137 @@
+import os
+import re
+import sys
+import json
+import hashlib
+import logging
+import threading
+from importlib import metadata
+
+def _requirement_class():
+    try:
+        from packaging.requirements import Requirement
+    except ImportError:
+        from pip._vendor.packaging.requirements import Requirement
+    return Requirement
+
+def normalize_name(name):
+    return re.sub(r'[-_.]+', '-', name).lower()
+
+class PipDependencyResolver:
+    """
+    Resolves transitive dependencies of pip requirements in the installed environment to pinned 'name==version' ones.
+    Closures of requirements are cached by the fingerprint of installed distributions in memory and in cache_file,
+    so they are resolved once per environment.
+    """
+
+    def __init__(self, cache_file=None):
+        """
+        @param cache_file - json file keeping resolved closures between kernels, closures are kept in memory only if None
+        """
+        self._cache_file = cache_file
+        self._cache = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def environment_fingerprint():
+        """
+        @return hash of the metadata directories of installed distributions, their names include versions
+        """
+        entries = []
+        for path in sys.path:
+            if os.path.isdir(path):
+                entries += [f'{path}/{x}' for x in os.listdir(path) if x.endswith(('.dist-info', '.egg-info'))]
+        return hashlib.sha256('\n'.join(sorted(entries)).encode()).hexdigest()
+
+    @staticmethod
+    def requirement_name(requirement):
+        """
+        @return normalized distribution name of the requirement string or None if it is not a named requirement
+        """
+        try:
+            return normalize_name(_requirement_class()(requirement).name)
+        except Exception:
+            return None
+
+    def resolve(self, requirements):
+        """
+        @param requirements - requirement strings, e.g. lines of requirements.txt
+        @return sorted pinned requirements of all transitive dependencies, requirements themselves are not included
+        """
+        Requirement = _requirement_class()
+        roots = []
+        for requirement in requirements:
+            try:
+                roots.append(Requirement(requirement))
+            except Exception:
+                logging.warning(f"Dependencies of '{requirement}' are not inferred, it is not a named requirement")
+
+        fingerprint = self.environment_fingerprint()
+        with self._lock:
+            cache = self._load_cache(fingerprint)
+            closures = {}
+            for root in roots:
+                root_key = normalize_name(root.name) + ''.join(f'[{x}]' for x in sorted(root.extras))
+                if root_key not in cache['closures']:
+                    cache['closures'][root_key] = self._resolve_closure(root)
+                closures[normalize_name(root.name)] = cache['closures'][root_key]
+            self._save_cache(cache)
+
+        pinned = {}
+        for closure in closures.values():
+            for name, version in closure:
+                if normalize_name(name) not in closures:
+                    pinned[normalize_name(name)] = f'{name}=={version}'
+        return sorted(pinned.values())
+
+    @staticmethod
+    def _resolve_closure(root):
+        """
+        @return list of (name, version) of installed distributions required by root, transitively,
+                requirements with markers not matching this environment and requested extras are skipped
+        """
+        Requirement = _requirement_class()
+        closure = {}
+        visited = set()
+        stack = [(root, True)]
+        while stack:
+            requirement, is_root = stack.pop()
+            name = normalize_name(requirement.name)
+            extras = frozenset(requirement.extras)
+            if (name, extras) in visited:
+                continue
+            visited.add((name, extras))
+            try:
+                distribution = metadata.distribution(requirement.name)
+            except metadata.PackageNotFoundError:
+                logging.warning(f"Package '{requirement.name}' is not installed, its dependencies are not inferred")
+                continue
+            if not is_root:
+                closure[name] = (distribution.metadata['Name'], distribution.version)
+            for required in distribution.requires or []:
+                required = Requirement(required)
+                if required.marker and not any(required.marker.evaluate({'extra': x}) for x in (extras or {''})):
+                    continue
+                stack.append((required, False))
+        return sorted(closure.values())
+
+    def _load_cache(self, fingerprint):
+        if self._cache is None and self._cache_file and os.path.isfile(self._cache_file):
+            try:
+                with open(self._cache_file) as f_id:
+                    self._cache = json.load(f_id)
+            except ValueError:
+                self._cache = None
+        if self._cache is None or self._cache.get('fingerprint') != fingerprint:
+            # closures of other environments are dropped, packages of the image change rarely
+            self._cache = {'fingerprint': fingerprint, 'closures': {}}
+        return self._cache
+
+    def _save_cache(self, cache):
+        if not self._cache_file:
+            return
+        os.makedirs(os.path.dirname(self._cache_file), exist_ok=True)
+        tmp_cache_file = f'{self._cache_file}.{os.getpid()}.tmp'
+        with open(tmp_cache_file, 'w') as f_id:
+            json.dump(cache, f_id)
+        os.replace(tmp_cache_file, self._cache_file)
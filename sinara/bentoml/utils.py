@@ -2,6 +2,11 @@ import os
 from pathlib import Path
 import hashlib
 import json
+import zipfile
+
+# Already compressed files, written to the zip uncompressed as deflating them takes CPU without saving space
+ZIP_STORED_EXTENSIONS = ('.zip', '.gz', '.bz2', '.xz', '.zst', '.7z', '.parquet', '.onnx', '.pt', '.pth', '.h5',
+                         '.jpg', '.jpeg', '.png')
 
 def process_artifacts_archive(bentoservice, bentoservice_root_dir):
     bentoservice.postprocess(bentoservice_root_dir)
@@ -36,3 +41,22 @@ def save_bentoservice_profile(bentoservice_root_dir, bentoservice_profile):
     profile_file = os.path.join(bentoservice_root_dir, 'bentoservice_profile.json')
     with open(profile_file, 'w+') as f:
         json.dump(bentoservice_profile, f)
+
+def write_zip(src_dir, fileobj, stored_extensions=ZIP_STORED_EXTENSIONS):
+    """
+    Writes zip of the directory to the binary file object, which may be not seekable
+    @param src_dir - directory to zip, member names are relative to it as in shutil.make_archive
+    @param fileobj - file object to write to
+    @param stored_extensions - files with these extensions are stored uncompressed, others are deflated
+    """
+    stored_extensions = tuple(x.lower() for x in stored_extensions)
+    with zipfile.ZipFile(fileobj, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+        for dir_path, dir_names, file_names in os.walk(src_dir):
+            dir_names.sort()
+            rel_dir = os.path.relpath(dir_path, src_dir)
+            if rel_dir != '.':
+                zip_file.write(dir_path, rel_dir)
+            for file_name in sorted(file_names):
+                compress_type = zipfile.ZIP_STORED if file_name.lower().endswith(stored_extensions) else zipfile.ZIP_DEFLATED
+                zip_file.write(os.path.join(dir_path, file_name), os.path.normpath(os.path.join(rel_dir, file_name)),
+                               compress_type=compress_type)
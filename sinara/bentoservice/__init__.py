@@ -1,3 +1,4 @@
 from .binary_artifact import *
 from .onnx_artifact import *
-from .profiles import *
\ No newline at end of file
+from .profiles import *
+from .microbatch import MicroBatcher
\ No newline at end of file
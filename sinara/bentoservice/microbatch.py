@@ -0,0 +1,107 @@
+import os
+import time
+import queue
+import threading
+
+# Defaults of MicroBatcher, can be set in the environment of the served BentoService
+MICROBATCH_MAX_BATCH_SIZE = int(os.environ.get('SINARA_MICROBATCH_MAX_BATCH_SIZE', '1000'))
+MICROBATCH_MAX_LATENCY_MS = float(os.environ.get('SINARA_MICROBATCH_MAX_LATENCY_MS', '10'))
+
+class _MicroBatchRequest:
+    def __init__(self, rows):
+        self.rows = rows
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class MicroBatcher:
+    """
+    Groups concurrent predict calls into batches: rows of calls are concatenated into one numpy block,
+    predicted by a single call of predict_fn and the results are scattered back to the callers.
+    Waiting for more calls is adaptive: it happens only while the previous batch had several calls,
+    so a single client gets no added latency.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=MICROBATCH_MAX_BATCH_SIZE, max_latency_ms=MICROBATCH_MAX_LATENCY_MS):
+        """
+        @param predict_fn - function of 2d numpy array returning a result row per input row
+        @param max_batch_size - max number of rows in a batch, a call with more rows is predicted as a batch of its own
+        @param max_latency_ms - max time the first call of a batch waits for other calls to join it
+        """
+        self._predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_latency_ms = max_latency_ms
+        self.stats = {'batches': 0, 'requests': 0, 'rows': 0}
+        self._queue = queue.Queue()
+        self._held_request = None
+        self._last_batch_requests = 0
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def predict(self, data):
+        """
+        Predicts rows of data in a batch with rows of concurrent calls
+        @param data - pandas DataFrame or 2d numpy array
+        @return numpy array of results of data rows
+        """
+        import numpy as np
+        rows = data.values if hasattr(data, 'values') else np.asarray(data)
+        request = _MicroBatchRequest(rows)
+        self._ensure_worker()
+        self._queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='sinara-microbatch', daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            self._predict_batch(batch)
+
+    def _collect_batch(self):
+        first = self._held_request or self._queue.get()
+        self._held_request = None
+        batch = [first]
+        batch_size = len(first.rows)
+        wait = self._last_batch_requests > 1
+        deadline = time.monotonic() + self.max_latency_ms / 1000
+        while batch_size < self.max_batch_size:
+            try:
+                if wait:
+                    request = self._queue.get(timeout=max(0, deadline - time.monotonic()))
+                else:
+                    request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if batch_size + len(request.rows) > self.max_batch_size:
+                self._held_request = request
+                break
+            batch.append(request)
+            batch_size += len(request.rows)
+        self._last_batch_requests = len(batch)
+        return batch
+
+    def _predict_batch(self, batch):
+        import numpy as np
+        try:
+            block = batch[0].rows if len(batch) == 1 else np.concatenate([x.rows for x in batch])
+            results = np.asarray(self._predict_fn(block))
+            offset = 0
+            for request in batch:
+                request.result = results[offset:offset + len(request.rows)]
+                offset += len(request.rows)
+        except Exception as e:
+            for request in batch:
+                request.error = e
+        self.stats['batches'] += 1
+        self.stats['requests'] += len(batch)
+        self.stats['rows'] += sum(len(x.rows) for x in batch)
+        for request in batch:
+            request.done.set()
@@ -0,0 +1,183 @@
+import os
+import json
+import time
+import shutil
+import fcntl
+import hashlib
+import threading
+import logging
+from pathlib import Path
+from contextlib import contextmanager
+
+class SinaraLocalCache:
+    """
+    Persistent cache of directories on the local disk.
+    Entries are identified by a key, shared with consumers via hardlinks and evicted by LRU when total size exceeds max_size.
+    Files of linked entries share inodes with the cache, so they must be treated as read-only.
+    """
+
+    INDEX_FILE_NAME = 'index.json'
+    LOCK_FILE_NAME = '.lock'
+
+    def __init__(self, cache_dir, max_size):
+        """
+        @param cache_dir - local directory of the cache
+        @param max_size - total size of cached entries in bytes
+        """
+        self._cache_dir = Path(cache_dir)
+        self._max_size = max_size
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        self._cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def make_key(*parts):
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+    def entry_path(self, key):
+        return self._cache_dir / key
+
+    def get(self, key):
+        """
+        @return path of the cached entry or None, counts the lookup as a hit or a miss
+        """
+        with self._locked_index() as index:
+            if key in index and self.entry_path(key).is_dir():
+                index[key]['last_access'] = time.time()
+                self.stats['hits'] += 1
+                logging.info(f"Cache hit for '{index[key]['source']}' in '{self._cache_dir}'")
+                return self.entry_path(key)
+            index.pop(key, None)
+        self.stats['misses'] += 1
+        return None
+
+    def put(self, key, source, populate):
+        """
+        Creates the cache entry
+        @param key - key of the entry
+        @param source - description of the entry source to log
+        @param populate - function filling the directory passed as its argument
+        @return path of the cached entry
+        """
+        logging.info(f"Cache miss for '{source}' in '{self._cache_dir}'")
+        staging_path = self._cache_dir / f'.staging-{key}-{os.getpid()}'
+        shutil.rmtree(staging_path, ignore_errors=True)
+        staging_path.mkdir(parents=True)
+        try:
+            populate(str(staging_path))
+            with self._locked_index() as index:
+                shutil.rmtree(self.entry_path(key), ignore_errors=True)
+                staging_path.rename(self.entry_path(key))
+                index[key] = {'source': str(source), 'size': _dir_size(self.entry_path(key)), 'last_access': time.time()}
+                self._evict(index, keep=key)
+        finally:
+            shutil.rmtree(staging_path, ignore_errors=True)
+        return self.entry_path(key)
+
+    def link(self, key, dst_dir):
+        """
+        Recreates dst_dir as a tree of hardlinks to the cached entry, files are copied if hardlinks are not supported
+        """
+        entry_path = self.entry_path(key)
+        shutil.rmtree(dst_dir, ignore_errors=True)
+        for src_dir, _, file_names in os.walk(entry_path):
+            target_dir = Path(dst_dir) / Path(src_dir).relative_to(entry_path)
+            target_dir.mkdir(parents=True, exist_ok=True)
+            for file_name in file_names:
+                try:
+                    os.link(Path(src_dir) / file_name, target_dir / file_name)
+                except OSError:
+                    shutil.copy2(Path(src_dir) / file_name, target_dir / file_name)
+
+    def _evict(self, index, keep):
+        total_size = sum(entry['size'] for entry in index.values())
+        for key in sorted(index, key=lambda x: index[x]['last_access']):
+            if total_size <= self._max_size:
+                break
+            if key == keep:
+                continue
+            logging.info(f"Cache eviction of '{index[key]['source']}' from '{self._cache_dir}'")
+            shutil.rmtree(self.entry_path(key), ignore_errors=True)
+            total_size -= index.pop(key)['size']
+            self.stats['evictions'] += 1
+
+    @contextmanager
+    def _locked_index(self):
+        with open(self._cache_dir / self.LOCK_FILE_NAME, 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            index_path = self._cache_dir / self.INDEX_FILE_NAME
+            index = {}
+            if index_path.is_file():
+                with open(index_path) as f_id:
+                    index = json.load(f_id)
+            yield index
+            tmp_index_path = index_path.with_suffix('.tmp')
+            with open(tmp_index_path, 'w') as f_id:
+                json.dump(index, f_id)
+            os.replace(tmp_index_path, index_path)
+
+class SinaraChunkCache:
+    """
+    Persistent cache of content-addressed chunks on the local disk, every chunk is a file named by its sha256.
+    Chunks are verified against their hash before they are cached and evicted by LRU when total size exceeds max_size.
+    The cache is shared by the driver and local executors by its directory, so it keeps no in-memory state.
+    """
+
+    def __init__(self, cache_dir, max_size):
+        """
+        @param cache_dir - local directory of the cache
+        @param max_size - total size of cached chunks in bytes
+        """
+        self._cache_dir = Path(cache_dir)
+        self._max_size = max_size
+        self._cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def chunk_path(self, chunk_hash):
+        return self._cache_dir / chunk_hash[:2] / chunk_hash
+
+    def get(self, chunk_hash):
+        """
+        @return content of the cached chunk or None
+        """
+        try:
+            with open(self.chunk_path(chunk_hash), 'rb') as f_id:
+                content = f_id.read()
+        except FileNotFoundError:
+            return None
+        # mtime is the last access time used by eviction, atime may be not updated by the mount
+        os.utime(self.chunk_path(chunk_hash))
+        return content
+
+    def put(self, chunk_hash, content):
+        """
+        Caches the chunk after verifying its content against the hash
+        """
+        verify_chunk(chunk_hash, content)
+        chunk_path = self.chunk_path(chunk_hash)
+        chunk_path.parent.mkdir(exist_ok=True)
+        tmp_chunk_path = chunk_path.with_name(f'.{chunk_hash}.{os.getpid()}.{threading.get_ident()}')
+        with open(tmp_chunk_path, 'wb') as f_id:
+            f_id.write(content)
+        os.replace(tmp_chunk_path, chunk_path)
+
+    def evict(self):
+        """
+        Removes least recently used chunks until total size fits max_size
+        @return number of evicted chunks
+        """
+        chunks = [(x.stat(), x) for x in self._cache_dir.glob('*/*') if not x.name.startswith('.')]
+        total_size = sum(chunk_stat.st_size for chunk_stat, _ in chunks)
+        evicted = 0
+        for chunk_stat, chunk_path in sorted(chunks, key=lambda x: x[0].st_mtime):
+            if total_size <= self._max_size:
+                break
+            chunk_path.unlink(missing_ok=True)
+            total_size -= chunk_stat.st_size
+            evicted += 1
+        return evicted
+
+def verify_chunk(chunk_hash, content):
+    if hashlib.sha256(content).hexdigest() != chunk_hash:
+        raise Exception(f"Content of the chunk doesn't match its hash {chunk_hash}")
+
+def _dir_size(dir_path):
+    return sum(f.stat().st_size for f in Path(dir_path).glob('**/*') if f.is_file())
@@ -1,3 +1,14 @@
 from ..common import importSinaraModuleClass
 
-SinaraFileSystem = importSinaraModuleClass(module_name = "fs", class_name = "SinaraFileSystem")
\ No newline at end of file
+SinaraFileSystem = importSinaraModuleClass(module_name = "fs", class_name = "SinaraFileSystem")
+
+try:
+    AsyncSinaraFileSystem = importSinaraModuleClass(module_name = "fs", class_name = "AsyncSinaraFileSystem")
+except AttributeError:
+    # infras without the async file system get the generic one running calls of their file system in threads
+    class AsyncSinaraFileSystem(object):
+
+        @staticmethod
+        def FileSystem():
+            from .fs import _AsyncSinaraFileSystem
+            return type('_AsyncSinaraFileSystem', (_AsyncSinaraFileSystem,), {'fs': SinaraFileSystem.FileSystem()})
@@ -1,7 +1,16 @@
+import os
+import time
+import asyncio
+import threading
 from abc import (
   ABC,
   abstractmethod,
 )
+from concurrent.futures import ThreadPoolExecutor
+
+# Defaults of bulk operations: concurrent transfers and attempts of every transfer
+TRANSFER_WORKERS = 8
+TRANSFER_RETRIES = 3
 
 class _SinaraFileSystem(ABC):
 
@@ -19,6 +28,22 @@ class _SinaraFileSystem(ABC):
     @abstractmethod
     def get(srcpath, dstpath):
         pass
+
+    @staticmethod
+    @abstractmethod
+    def info(path):
+        """
+        @return dict with 'size' and 'mtime' of the file
+        """
+        pass
+    
+    @staticmethod
+    @abstractmethod
+    def open(path, mode='rb'):
+        """
+        @return binary file object of the path for sequential reading or writing
+        """
+        pass
     
     @staticmethod
     @abstractmethod
@@ -34,3 +59,154 @@ class _SinaraFileSystem(ABC):
     @abstractmethod
     def touch(path):
         pass
+
+    @classmethod
+    def last_run_id(cls, step_path, entity_name):
+        """
+        @return the latest run id of the step having the entity with _SUCCESS file or None
+        """
+        entity_paths = cls.glob(f"{step_path}/*/{entity_name}/_SUCCESS")
+        run_ids = sorted([entity_path.split("/")[-3] for entity_path in entity_paths])
+        return run_ids[-1] if run_ids else None
+
+    @classmethod
+    def get_many(cls, srcpaths, dstpaths, workers=TRANSFER_WORKERS, retries=TRANSFER_RETRIES, callback=None):
+        """
+        Downloads files concurrently by get
+        @param srcpaths - paths in the store
+        @param dstpaths - local paths of the same length
+        @param workers - number of concurrent transfers
+        @param retries - number of attempts of every transfer
+        @param callback - called with numbers of transferred and of all files after every transfer
+        """
+        cls._transfer_many(cls.get, srcpaths, dstpaths, workers, retries, callback)
+
+    @classmethod
+    def put_many(cls, srcpaths, dstpaths, workers=TRANSFER_WORKERS, retries=TRANSFER_RETRIES, callback=None):
+        """
+        Uploads files concurrently by put, see get_many
+        """
+        cls._transfer_many(cls.put, srcpaths, dstpaths, workers, retries, callback)
+
+    @classmethod
+    def copytree(cls, srcdir, dstdir, workers=TRANSFER_WORKERS, retries=TRANSFER_RETRIES, callback=None):
+        """
+        Uploads the local directory with all subdirectories to the store path, see get_many
+        """
+        srcpaths = []
+        dstpaths = []
+        for dirpath, _, filenames in os.walk(srcdir):
+            target_dir = os.path.join(str(dstdir), os.path.relpath(dirpath, srcdir))
+            cls.makedirs(os.path.normpath(target_dir))
+            srcpaths += [os.path.join(dirpath, x) for x in filenames]
+            dstpaths += [os.path.normpath(os.path.join(target_dir, x)) for x in filenames]
+        cls.put_many(srcpaths, dstpaths, workers=workers, retries=retries, callback=callback)
+
+    @staticmethod
+    def _transfer_many(transfer, srcpaths, dstpaths, workers, retries, callback):
+        srcpaths = list(srcpaths)
+        dstpaths = list(dstpaths)
+        if len(srcpaths) != len(dstpaths):
+            raise Exception(f"Got {len(srcpaths)} source paths and {len(dstpaths)} destination paths")
+        lock = threading.Lock()
+        transferred = [0]
+
+        def transfer_with_retries(paths):
+            for attempt in range(retries):
+                try:
+                    transfer(*paths)
+                    break
+                except Exception:
+                    if attempt == retries - 1:
+                        raise
+                    time.sleep(0.1 * 2 ** attempt)
+            if callback:
+                with lock:
+                    transferred[0] += 1
+                    callback(transferred[0], len(srcpaths))
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            list(pool.map(transfer_with_retries, zip(srcpaths, dstpaths)))
+
+
+_async_executor = None
+_async_executor_lock = threading.Lock()
+
+def _get_async_executor():
+    global _async_executor
+    with _async_executor_lock:
+        if _async_executor is None:
+            _async_executor = ThreadPoolExecutor(max_workers=TRANSFER_WORKERS, thread_name_prefix='sinara-fs')
+        return _async_executor
+
+class _AsyncSinaraFileSystem(object):
+    """
+    Coroutine counterpart of the infra file system, the blocking calls of fs run in the shared thread executor
+    """
+
+    # file system class of the infra, set by subclasses
+    fs = None
+
+    @classmethod
+    async def aget(cls, srcpath, dstpath):
+        return await cls._run(cls.fs.get, srcpath, dstpath)
+
+    @classmethod
+    async def aput(cls, srcpath, dstpath):
+        return await cls._run(cls.fs.put, srcpath, dstpath)
+
+    @classmethod
+    async def aglob(cls, path):
+        return await cls._run(cls.fs.glob, path)
+
+    @classmethod
+    async def aexists(cls, path):
+        return await cls._run(cls.fs.exists, path)
+
+    @classmethod
+    def get_many(cls, srcpaths, dstpaths):
+        """
+        Downloads files concurrently, the sync facade of aget
+        """
+        return cls.gather(*[cls.aget(src, dst) for src, dst in zip(srcpaths, dstpaths)])
+
+    @classmethod
+    def put_many(cls, srcpaths, dstpaths):
+        """
+        Uploads files concurrently, the sync facade of aput
+        """
+        return cls.gather(*[cls.aput(src, dst) for src, dst in zip(srcpaths, dstpaths)])
+
+    @classmethod
+    def glob_many(cls, paths):
+        """
+        @return list of glob results of every path, globs run concurrently
+        """
+        return cls.gather(*[cls.aglob(path) for path in paths])
+
+    @classmethod
+    def exists_many(cls, paths):
+        """
+        @return list of exists results of every path, checks run concurrently
+        """
+        return cls.gather(*[cls.aexists(path) for path in paths])
+
+    @staticmethod
+    def gather(*aws):
+        """
+        Runs awaitables concurrently and waits for them
+        Works in Jupyter as well, where the event loop is already running in the calling thread
+        @return list of results in the order of aws
+        """
+        async def gather_all():
+            return await asyncio.gather(*aws)
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(gather_all())
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            return pool.submit(asyncio.run, gather_all()).result()
+
+    @staticmethod
+    async def _run(func, *args):
+        return await asyncio.get_running_loop().run_in_executor(_get_async_executor(), func, *args)
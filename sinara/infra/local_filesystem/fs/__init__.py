@@ -1,3 +1,4 @@
-from .fs import SinaraLocalFileSystem
+from .fs import SinaraLocalFileSystem, AsyncSinaraLocalFileSystem
 
 SinaraFileSystem = SinaraLocalFileSystem
+AsyncSinaraFileSystem = AsyncSinaraLocalFileSystem
@@ -1,6 +1,11 @@
 import os
+import json
+import errno
+import time
 import shutil
+import threading
 from pathlib import Path
+from functools import partial
 import sys
 
 class SinaraLocalFileSystem(object):
@@ -9,36 +14,237 @@ class SinaraLocalFileSystem(object):
     def FileSystem():
         return _SinaraLocalFileSystem
 
+class AsyncSinaraLocalFileSystem(object):
+
+    @staticmethod
+    def FileSystem():
+        return _AsyncSinaraLocalFileSystem
+
 # setting Sinara abstract class
 sys.path.append('../../sinara')
 
 # importing
-from sinara.fs.fs import _SinaraFileSystem
+from sinara.fs.fs import _SinaraFileSystem, _AsyncSinaraFileSystem, TRANSFER_WORKERS, TRANSFER_RETRIES
+
+# Results of glob are cached for SINARA_FS_GLOB_CACHE_TTL seconds, the cache is dropped by every change made through
+# the filesystem. Disabled by default as files written bypassing the filesystem, e.g. by Apache Spark, are not seen.
+GLOB_CACHE_TTL = float(os.environ.get('SINARA_FS_GLOB_CACHE_TTL', '0'))
+_glob_cache = {}
+_glob_cache_lock = threading.Lock()
+
+# Sorted run ids of the step kept in <step_path>/.run_index/index.json with the mtime of the step directory.
+# The index is stale when the step directory changed after it was written, i.e. a run was added or removed.
+# It is kept in a directory of its own, so rewriting the index doesn't change the step directory.
+RUN_INDEX_DIR_NAME = '.run_index'
+RUN_INDEX_FILE_NAME = 'index.json'
 
 class _SinaraLocalFileSystem(_SinaraFileSystem):
     
     @staticmethod
     def glob(path):
         import glob
-        return glob.glob(path)
+        if GLOB_CACHE_TTL <= 0:
+            return glob.glob(path)
+        now = time.monotonic()
+        with _glob_cache_lock:
+            cached = _glob_cache.get(path)
+        if cached and now - cached[0] < GLOB_CACHE_TTL:
+            return list(cached[1])
+        result = glob.glob(path)
+        with _glob_cache_lock:
+            _glob_cache[path] = (now, result)
+        return list(result)
     
     @staticmethod
     def exists(path):
         return os.path.exists(path)
 
+    # inputs copied from the store by get are hardlinked if SINARA_HARDLINK_INPUTS is set,
+    # hardlinked inputs share content with the store, so they must be treated as read-only
+    HARDLINK_INPUTS = os.environ.get('SINARA_HARDLINK_INPUTS', '').lower() in ('1', 'true', 'yes')
+
     @staticmethod
-    def get(srcpath, dstpath):
-        shutil.copyfile(srcpath, dstpath)
+    def get(srcpath, dstpath, hardlink=None):
+        _invalidate_glob_cache()
+        _copy_file(srcpath, dstpath, _SinaraLocalFileSystem.HARDLINK_INPUTS if hardlink is None else hardlink)
+
+    @staticmethod
+    def info(path):
+        path_stat = os.stat(path)
+        return {'size': path_stat.st_size, 'mtime': path_stat.st_mtime}
+    
+    @staticmethod
+    def open(path, mode='rb'):
+        if 'r' not in mode:
+            _invalidate_glob_cache()
+        return open(path, mode)
     
     @staticmethod
     def makedirs(path):
+        _invalidate_glob_cache()
         if not os.path.isdir(path):
             os.makedirs(path)
     
     @staticmethod
     def put(srcpath, dstpath):
-        shutil.copyfile(srcpath, dstpath)
+        _invalidate_glob_cache()
+        _copy_file(srcpath, dstpath)
     
     @staticmethod
     def touch(path):
+        _invalidate_glob_cache()
         Path(path).touch()
+
+    @classmethod
+    def last_run_id(cls, step_path, entity_name):
+        """
+        Run ids are taken from the run index of the step, the step directory is listed only if the index
+        is missing or stale. Runs are checked for _SUCCESS of the entity from the latest one down,
+        so usually a single run is looked at. _SUCCESS files are checked every time, as the ones written
+        by Apache Spark bypass the filesystem.
+        """
+        run_ids = _load_run_ids(step_path)
+        for run_id in reversed(run_ids):
+            if os.path.exists(f"{step_path}/{run_id}/{entity_name}/_SUCCESS"):
+                return run_id
+        return None
+
+    @classmethod
+    def get_many(cls, srcpaths, dstpaths, workers=TRANSFER_WORKERS, retries=TRANSFER_RETRIES, callback=None, hardlink=None):
+        """
+        Copies files concurrently in the kernel, see _SinaraFileSystem.get_many
+        @param hardlink - hardlink files instead of copying where the filesystem allows, HARDLINK_INPUTS if None,
+                          linked files share content with the source, so they must not be modified
+        """
+        _invalidate_glob_cache()
+        cls._transfer_many(partial(cls.get, hardlink=hardlink), srcpaths, dstpaths, workers, retries, callback)
+
+    @classmethod
+    def put_many(cls, srcpaths, dstpaths, workers=TRANSFER_WORKERS, retries=TRANSFER_RETRIES, callback=None, hardlink=False):
+        """
+        Copies files concurrently in the kernel, see get_many
+        """
+        _invalidate_glob_cache()
+        cls._transfer_many(partial(_copy_file, hardlink=hardlink), srcpaths, dstpaths, workers, retries, callback)
+
+class _AsyncSinaraLocalFileSystem(_AsyncSinaraFileSystem):
+    fs = _SinaraLocalFileSystem
+
+def _invalidate_glob_cache():
+    with _glob_cache_lock:
+        _glob_cache.clear()
+
+def _read_run_index(step_path):
+    run_index_path = Path(step_path, RUN_INDEX_DIR_NAME, RUN_INDEX_FILE_NAME)
+    try:
+        with open(run_index_path) as f_id:
+            return json.load(f_id)
+    except (OSError, ValueError):
+        return None
+
+def _load_run_ids(step_path):
+    """
+    @return sorted run ids of the step from its run index, the step directory is listed once
+            if the index is missing or stale, no run ids if there is no step directory
+    """
+    try:
+        step_mtime = os.stat(step_path).st_mtime_ns
+    except FileNotFoundError:
+        return []
+    run_index = _read_run_index(step_path)
+    if run_index is not None and run_index.get('mtime') == step_mtime:
+        return run_index['runs']
+
+    # the index directory is made before the step is listed, so making it doesn't stale the index
+    try:
+        os.makedirs(Path(step_path, RUN_INDEX_DIR_NAME), exist_ok=True)
+        step_mtime = os.stat(step_path).st_mtime_ns
+    except OSError:
+        pass
+    run_ids = sorted(x for x in os.listdir(step_path) if not x.startswith('.'))
+    _write_run_index(step_path, {'mtime': step_mtime, 'runs': run_ids})
+    return run_ids
+
+def _write_run_index(step_path, run_index):
+    """
+    The index is replaced atomically and left as is if the step path isn't writable
+    """
+    run_index_path = Path(step_path, RUN_INDEX_DIR_NAME, RUN_INDEX_FILE_NAME)
+    tmp_run_index_path = Path(step_path, RUN_INDEX_DIR_NAME, f'{RUN_INDEX_FILE_NAME}.{os.getpid()}.{threading.get_ident()}')
+    try:
+        with open(tmp_run_index_path, 'w') as f_id:
+            json.dump(run_index, f_id)
+        os.replace(tmp_run_index_path, run_index_path)
+    except OSError:
+        pass
+
+# ioctl request cloning the whole file, see ioctl_ficlone(2)
+FICLONE = 0x40049409
+
+def _reflink(src, dst, size):
+    import fcntl
+    fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+
+def _copy_file_range(src, dst, size):
+    offset = 0
+    while offset < size:
+        copied = os.copy_file_range(src.fileno(), dst.fileno(), size - offset, offset, offset)
+        if copied == 0:
+            raise OSError(f"copy_file_range stopped at {offset} of {size} bytes")
+        offset += copied
+
+def _sendfile(src, dst, size):
+    offset = 0
+    while offset < size:
+        copied = os.sendfile(dst.fileno(), src.fileno(), offset, size - offset)
+        if copied == 0:
+            raise OSError(f"sendfile stopped at {offset} of {size} bytes")
+        offset += copied
+
+def _buffered_copy(src, dst, size):
+    shutil.copyfileobj(src, dst, 1024 * 1024)
+
+# Transfer strategies in the order they are tried: copy-on-write clone, in-kernel copies and plain copy
+TRANSFER_STRATEGIES = [_reflink, _copy_file_range, _sendfile, _buffered_copy]
+
+# strategies failed for pairs of source and destination devices are not tried again,
+# only errors telling the strategy isn't supported there mark it, other errors like ENOSPC are raised
+_unsupported_strategies = set()
+UNSUPPORTED_ERRNOS = {errno.EXDEV, errno.EOPNOTSUPP, errno.EINVAL, errno.ENOSYS, errno.ENOTTY}
+
+def _copy_file(srcpath, dstpath, hardlink=False):
+    """
+    Transfers the file by the first of TRANSFER_STRATEGIES supported for the pair of filesystems.
+    The destination is always a new file, so files hardlinked before are never overwritten in place.
+    @param hardlink - hardlink the file instead where the filesystem allows
+    """
+    if os.path.lexists(dstpath):
+        if os.path.samefile(srcpath, dstpath):
+            return
+        os.remove(dstpath)
+    if hardlink:
+        try:
+            os.link(srcpath, dstpath)
+            return
+        except OSError:
+            pass
+    with open(srcpath, 'rb') as src, open(dstpath, 'wb') as dst:
+        src_stat = os.fstat(src.fileno())
+        devices = (src_stat.st_dev, os.fstat(dst.fileno()).st_dev)
+        for strategy in TRANSFER_STRATEGIES:
+            if (strategy.__name__, devices) in _unsupported_strategies:
+                continue
+            try:
+                strategy(src, dst, src_stat.st_size)
+                return
+            except (OSError, AttributeError, ImportError) as e:
+                if strategy is TRANSFER_STRATEGIES[-1]:
+                    raise
+                stopped_short = isinstance(e, OSError) and e.errno is None
+                if isinstance(e, OSError) and not stopped_short and e.errno not in UNSUPPORTED_ERRNOS:
+                    raise
+                # a copy stopped short falls back to the next strategy for this file only
+                if not stopped_short:
+                    _unsupported_strategies.add((strategy.__name__, devices))
+                dst.seek(0)
+                dst.truncate()
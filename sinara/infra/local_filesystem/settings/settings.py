@@ -52,6 +52,18 @@ class _SinaraSettings(__SinaraSettings):
         if env_name not in env_paths:
             raise Exception("Unexpected env_name value:" + env_name)
         return env_paths[env_name]
+
+    def get_storage_unpack_workers():
+        return int(os.getenv("SINARA_ARCHIVE_UNPACK_WORKERS") or _SinaraSettings.SNR_SERVER_CORES)
+
+    def get_storage_cache_size():
+        return int(os.getenv("SINARA_ARCHIVE_CACHE_SIZE") or 10 * 1024 * 1024 * 1024)
+
+    def get_input_arrow_max_size():
+        return int(os.getenv("SINARA_INPUT_ARROW_MAX_SIZE") or 512 * 1024 * 1024)
+
+    def get_bentoservice_cache_size():
+        return int(os.getenv("SINARA_BENTOSERVICE_CACHE_SIZE") or 10 * 1024 * 1024 * 1024)
       
     @staticmethod
     def get_default_step_name():
@@ -0,0 +1,4 @@
+from .fs import SinaraS3FileSystem, AsyncSinaraS3FileSystem
+
+SinaraFileSystem = SinaraS3FileSystem
+AsyncSinaraFileSystem = AsyncSinaraS3FileSystem
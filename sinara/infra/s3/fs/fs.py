@@ -0,0 +1,138 @@
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import sys
+
+class SinaraS3FileSystem(object):
+
+    @staticmethod
+    def FileSystem():
+        return _SinaraS3FileSystem
+
+class AsyncSinaraS3FileSystem(object):
+
+    @staticmethod
+    def FileSystem():
+        return _AsyncSinaraS3FileSystem
+
+# setting Sinara abstract class
+sys.path.append('../../sinara')
+
+# importing
+from sinara.fs.fs import _SinaraFileSystem, _AsyncSinaraFileSystem
+from sinara.settings import _SinaraSettings
+
+# s3fs instance keeps the pool of connections, it is created once per process as forked processes can't share it
+_s3 = None
+_s3_pid = None
+_s3_lock = threading.Lock()
+
+def _get_s3():
+    global _s3, _s3_pid
+    with _s3_lock:
+        if _s3 is None or _s3_pid != os.getpid():
+            import s3fs
+            _s3 = s3fs.S3FileSystem(skip_instance_cache=True, **_SinaraSettings.get_storage_s3_options())
+            _s3_pid = os.getpid()
+        return _s3
+
+def _key(path):
+    """
+    @return 'bucket/key' of 's3://bucket/key' path, also of the one collapsed to 's3:/bucket/key' by pathlib
+    """
+    return re.sub(r'^s3:/+', '', str(path))
+
+class _SinaraS3FileSystem(_SinaraFileSystem):
+
+    @staticmethod
+    def glob(path):
+        return [f's3://{x}' for x in _get_s3().glob(_key(path))]
+
+    @staticmethod
+    def exists(path):
+        return _get_s3().exists(_key(path))
+
+    @staticmethod
+    def get(srcpath, dstpath):
+        """
+        Downloads the file by ranges of get_storage_s3_part_size() bytes in parallel, written straight to their offsets
+        """
+        s3 = _get_s3()
+        size = s3.info(_key(srcpath))['size']
+        part_size = _SinaraSettings.get_storage_s3_part_size()
+        if size <= part_size:
+            s3.get_file(_key(srcpath), str(dstpath))
+            return
+
+        def get_range(offset):
+            data = s3.cat_file(_key(srcpath), start=offset, end=min(offset + part_size, size))
+            fd = os.open(dstpath, os.O_WRONLY)
+            try:
+                view = memoryview(data)
+                while view:
+                    written = os.pwrite(fd, view, offset)
+                    view = view[written:]
+                    offset += written
+            finally:
+                os.close(fd)
+
+        with open(dstpath, 'wb') as f_id:
+            f_id.truncate(size)
+        with ThreadPoolExecutor(max_workers=_SinaraSettings.get_storage_s3_transfer_workers()) as pool:
+            list(pool.map(get_range, range(0, size, part_size)))
+
+    @staticmethod
+    def info(path):
+        info = _get_s3().info(_key(path))
+        mtime = info.get('LastModified')
+        return {'size': info['size'], 'mtime': mtime.timestamp() if mtime else None}
+
+    @staticmethod
+    def open(path, mode='rb'):
+        return _get_s3().open(_key(path), mode, block_size=_SinaraSettings.get_storage_s3_part_size())
+
+    @staticmethod
+    def makedirs(path):
+        # object storage has no directories, keys are created with their prefixes
+        pass
+
+    @staticmethod
+    def put(srcpath, dstpath):
+        """
+        Uploads the file by multipart upload, parts of get_storage_s3_part_size() bytes are uploaded in parallel
+        """
+        s3 = _get_s3()
+        size = os.path.getsize(srcpath)
+        part_size = _SinaraSettings.get_storage_s3_part_size()
+        if size <= part_size:
+            s3.put_file(str(srcpath), _key(dstpath))
+            return
+
+        bucket, key, _ = s3.split_path(_key(dstpath))
+        upload_id = s3.call_s3('create_multipart_upload', Bucket=bucket, Key=key)['UploadId']
+
+        def put_part(part_num):
+            with open(srcpath, 'rb') as f_id:
+                data = os.pread(f_id.fileno(), part_size, (part_num - 1) * part_size)
+            response = s3.call_s3('upload_part', Bucket=bucket, Key=key, UploadId=upload_id,
+                                  PartNumber=part_num, Body=data)
+            return {'PartNumber': part_num, 'ETag': response['ETag']}
+
+        try:
+            with ThreadPoolExecutor(max_workers=_SinaraSettings.get_storage_s3_transfer_workers()) as pool:
+                parts = list(pool.map(put_part, range(1, -(-size // part_size) + 1)))
+            s3.call_s3('complete_multipart_upload', Bucket=bucket, Key=key, UploadId=upload_id,
+                       MultipartUpload={'Parts': parts})
+        except Exception:
+            s3.call_s3('abort_multipart_upload', Bucket=bucket, Key=key, UploadId=upload_id)
+            raise
+        finally:
+            s3.invalidate_cache(_key(dstpath))
+
+    @staticmethod
+    def touch(path):
+        _get_s3().touch(_key(path))
+
+class _AsyncSinaraS3FileSystem(_AsyncSinaraFileSystem):
+    fs = _SinaraS3FileSystem
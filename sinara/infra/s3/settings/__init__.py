@@ -0,0 +1 @@
+from .settings import _SinaraSettings
\ No newline at end of file
@@ -0,0 +1,101 @@
+import sys
+
+# setting Sinara abstract class
+sys.path.append('../../sinara')
+
+# importing
+from sinara.settings.settings import __SinaraSettings
+
+import json
+import os
+
+from pathlib import Path
+
+class _SinaraSettings(__SinaraSettings):
+    def get_tmp_paths():
+        return {
+            "test": "/tmp/env/test",
+            "prod": "/tmp/env/prod",
+            "user": "/tmp/env/user"
+        }
+
+    def get_tmp_path(env_name):
+
+        tmp_paths = _SinaraSettings.get_tmp_paths()
+        if env_name not in tmp_paths:
+            raise Exception("Unexpected env_name value:" + env_name)
+
+        return tmp_paths[env_name]
+
+    def get_user():
+        nb_user = os.getenv("NB_USER") or "jovyan"
+        return os.getenv("DSML_USER") or nb_user
+
+    def get_bucket():
+        if "SINARA_S3_BUCKET" not in os.environ:
+            raise Exception("Please, set SinaraML storage bucket: os.environ[\"SINARA_S3_BUCKET\"] ")
+        return os.environ["SINARA_S3_BUCKET"]
+
+    def get_data_paths():
+        bucket = _SinaraSettings.get_bucket()
+        data_paths = {
+            "test": f"s3://{bucket}/products",
+            "prod": f"s3://{bucket}/production",
+            "user": f"s3://{bucket}/home/{_SinaraSettings.get_user()}"
+        }
+
+        custom_data_paths = {}
+        custom_config_path = f"sinara/infra/{os.environ['INFRA_NAME']}/settings/env.json"
+        if os.path.isfile(custom_config_path):
+            with open(custom_config_path) as json_file:
+                custom_data_paths = json.load(json_file)
+
+            data_paths = {**data_paths,**custom_data_paths}
+        return data_paths
+
+    def get_env_path(env_name):
+        env_paths = _SinaraSettings.get_data_paths()
+        if env_name not in env_paths:
+            raise Exception("Unexpected env_name value:" + env_name)
+        return env_paths[env_name]
+
+    def get_storage_unpack_workers():
+        return int(os.getenv("SINARA_ARCHIVE_UNPACK_WORKERS") or _SinaraSettings.SNR_SERVER_CORES)
+
+    def get_storage_cache_size():
+        return int(os.getenv("SINARA_ARCHIVE_CACHE_SIZE") or 10 * 1024 * 1024 * 1024)
+
+    def get_input_arrow_max_size():
+        return int(os.getenv("SINARA_INPUT_ARROW_MAX_SIZE") or 512 * 1024 * 1024)
+
+    def get_bentoservice_cache_size():
+        return int(os.getenv("SINARA_BENTOSERVICE_CACHE_SIZE") or 10 * 1024 * 1024 * 1024)
+
+    def get_storage_s3_options():
+        """
+        @return options of s3fs.S3FileSystem, credentials are taken from the standard AWS environment if not set
+        """
+        options = {}
+        if os.getenv("SINARA_S3_ENDPOINT_URL"):
+            options["client_kwargs"] = {"endpoint_url": os.environ["SINARA_S3_ENDPOINT_URL"]}
+        if os.getenv("SINARA_S3_ACCESS_KEY_ID"):
+            options["key"] = os.environ["SINARA_S3_ACCESS_KEY_ID"]
+            options["secret"] = os.getenv("SINARA_S3_SECRET_ACCESS_KEY")
+        return options
+
+    def get_storage_s3_part_size():
+        return int(os.getenv("SINARA_S3_PART_SIZE") or 32 * 1024 * 1024)
+
+    def get_storage_s3_transfer_workers():
+        return int(os.getenv("SINARA_S3_TRANSFER_WORKERS") or 8)
+
+    def get_storage_s3_spark_packages():
+        """
+        @return maven packages of the S3A connector added to Apache Spark, hadoop-aws of the bundled Hadoop version if not set
+        """
+        return os.getenv("SINARA_S3_SPARK_PACKAGES")
+
+    @staticmethod
+    def get_default_step_name():
+        step_folder_split = Path(os.getcwd()).name.split("-")
+        return '-'.join(step_folder_split[1::]) if len(step_folder_split) > 1 else None
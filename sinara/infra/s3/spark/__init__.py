@@ -0,0 +1 @@
+from .spark import *
\ No newline at end of file
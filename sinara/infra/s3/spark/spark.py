@@ -0,0 +1,67 @@
+from pyspark.conf import SparkConf
+
+import os
+import re
+import sys
+import glob
+import logging
+
+# setting Sinara abstract class
+sys.path.append('../../sinara')
+
+# importing
+from sinara.infra.local_filesystem.spark.spark import SinaraSpark as _SinaraLocalSpark
+from sinara.settings import _SinaraSettings
+
+class SinaraSpark(_SinaraLocalSpark):
+    """
+    Local Apache Spark session reading and writing 's3://' paths of the SinaraML storage through S3A connector
+    """
+
+    @staticmethod
+    def run_session(clusterSize=0 , app="SinaraML Spark App", conf=None, reuse_session=True, debug=False):
+        return _SinaraLocalSpark.run_session(clusterSize, app, SinaraSpark._s3_conf(conf), reuse_session, debug)
+
+    @staticmethod
+    def _s3_conf(conf = None):
+        if conf is None:
+            conf = SparkConf(False)
+
+        # stock pyspark has no S3A connector, hadoop-aws pulls the AWS SDK bundle it needs as a dependency
+        packages = _SinaraSettings.get_storage_s3_spark_packages() or SinaraSpark._hadoop_aws_package()
+        if packages:
+            conf_packages = conf.get("spark.jars.packages")
+            conf.set("spark.jars.packages", f"{conf_packages},{packages}" if conf_packages else packages)
+        elif packages is None:
+            logging.warning("hadoop-aws is not added to Apache Spark packages, the version of bundled Hadoop is unknown, "
+                            "set SINARA_S3_SPARK_PACKAGES e.g. to 'org.apache.hadoop:hadoop-aws:3.3.4'")
+        conf.set("spark.hadoop.fs.s3.impl", "org.apache.hadoop.fs.s3a.S3AFileSystem")
+        s3_options = _SinaraSettings.get_storage_s3_options()
+        endpoint_url = s3_options.get("client_kwargs", {}).get("endpoint_url")
+        if endpoint_url:
+            conf.set("spark.hadoop.fs.s3a.endpoint", endpoint_url)
+            conf.set("spark.hadoop.fs.s3a.path.style.access", "true")
+        if s3_options.get("key"):
+            conf.set("spark.hadoop.fs.s3a.access.key", s3_options["key"])
+            conf.set("spark.hadoop.fs.s3a.secret.key", s3_options["secret"])
+        conf.set("spark.hadoop.fs.s3a.connection.maximum", str(_SinaraSettings.get_storage_s3_transfer_workers() * 4))
+        return conf
+
+    @staticmethod
+    def _hadoop_aws_package():
+        """
+        @return hadoop-aws package of the Hadoop version Apache Spark is bundled with,
+                '' if Apache Spark has hadoop-aws already or None if the version isn't found
+        """
+        import pyspark
+        jars_dirs = [os.path.join(os.path.dirname(pyspark.__file__), 'jars')]
+        if os.getenv('SPARK_HOME'):
+            jars_dirs.append(os.path.join(os.environ['SPARK_HOME'], 'jars'))
+        jar_names = [os.path.basename(x) for jars_dir in jars_dirs for x in glob.glob(os.path.join(jars_dir, 'hadoop-*.jar'))]
+        if any(x.startswith('hadoop-aws-') for x in jar_names):
+            return ''
+        for jar_name in jar_names:
+            version = re.match(r'hadoop-(client-api|client-runtime|common)-(\d+\.\d+\.\d+)\.jar$', jar_name)
+            if version:
+                return f"org.apache.hadoop:hadoop-aws:{version.group(2)}"
+        return None
@@ -853,6 +853,7 @@ class StepReport:
 
                     tmp_tensorboard_log_dir = f"tmp/tensorboard"
                     log_events = fs.glob(f"{tmp_tensorboard_log_dir}/**/{run_id}/events.out*")
+                    output_paths = []
                     for log_path in log_events if not log_events is None else []:
                         p = Path(log_path)
                         events_file = p.name
@@ -861,7 +862,8 @@ class StepReport:
                         output_path = output_dir / events_file
                         fs.makedirs(output_dir)
                         print(f"Saving tensorboard logs {log_path} to {output_path}")
-                        fs.put(log_path, output_path)
+                        output_paths.append(output_path)
+                    fs.put_many(log_events or [], output_paths)
 
                 target_runinfo_path = f"{target_reports_dir_path}/runinfo.json"
                 target_report_path = f"{target_reports_dir_path}/report.html"
@@ -873,11 +875,10 @@ class StepReport:
                 ipynb_to_html(local_business_report_path, hmtl_local_business_report_path)
 
                 fs.makedirs(target_reports_dir_path)
-                fs.put(local_runinfo_path,target_runinfo_path)
-                fs.put(hmtl_local_report_path,target_report_path)
-                fs.put(hmtl_local_business_report_path,target_business_report_path)
-                fs.put(local_report_path,target_report_path_ipynb)
-                fs.put(local_metrics_path,target_metrics_path)
+                fs.put_many([local_runinfo_path, hmtl_local_report_path, hmtl_local_business_report_path,
+                             local_report_path, local_metrics_path],
+                            [target_runinfo_path, target_report_path, target_business_report_path,
+                             target_report_path_ipynb, target_metrics_path])
                 fs.touch(f"{target_reports_dir_path}/_SUCCESS")
 
                 os.remove(hmtl_local_report_path)
@@ -899,6 +900,7 @@ class StepReport:
  
                     tmp_tensorboard_log_dir = f"tmp/tensorboard"
                     log_events = fs.glob(f"{tmp_tensorboard_log_dir}/**/{run_id}/events.out*")
+                    output_paths = []
                     for log_path in log_events:
                         p = Path(log_path)
                         events_file = p.name
@@ -907,7 +909,8 @@ class StepReport:
                         output_path = output_dir / events_file
                         fs.makedirs(output_dir)
                         print(f"Saving tensorboard logs {log_path} to {output_path}")
-                        fs.put(log_path, output_path)
+                        output_paths.append(output_path)
+                    fs.put_many(log_events, output_paths)
 
                 # Set SUCCESS if there had not been no exceptions before
                 
@@ -924,10 +927,8 @@ class StepReport:
                 target_metrics_path = f"{target_reports_dir_path}/metrics.json"
 
                 fs.makedirs(target_reports_dir_path)
-                fs.put(local_runinfo_path,target_runinfo_path)
-                fs.put(local_report_path,target_report_path)
-                fs.put(local_report_path_py,target_report_path_py)
-                fs.put(local_metrics_path,target_metrics_path)
+                fs.put_many([local_runinfo_path, local_report_path, local_report_path_py, local_metrics_path],
+                            [target_runinfo_path, target_report_path, target_report_path_py, target_metrics_path])
                 fs.touch(f"{target_reports_dir_path}/_SUCCESS")
 
 class SinaraDiffReport:
@@ -1106,14 +1107,14 @@ class SinaraDiffReport:
         os.makedirs(me._local_diff_report_dir, exist_ok=False)
         
         fs = SinaraFileSystem.FileSystem()
-        list(map(fs.get, me._hdfs_module_added_paths, me._local_module_added_paths))
-        list(map(fs.get, me._hdfs_module_removed_paths, me._local_module_removed_paths))
-        list(map(fs.get, me._hdfs_module_curr_paths, me._local_module_curr_paths))
-        list(map(fs.get, me._hdfs_module_target_paths, me._local_module_target_paths))
-        list(map(fs.get, me._hdfs_module_added_paths_html, me._local_module_added_paths_html))
-        list(map(fs.get, me._hdfs_module_removed_paths_html, me._local_module_removed_paths_html))
-        list(map(fs.get, me._hdfs_module_curr_paths_html, me._local_module_curr_paths_html))
-        list(map(fs.get, me._hdfs_module_target_paths_html, me._local_module_target_paths_html))
+        fs.get_many([*me._hdfs_module_added_paths, *me._hdfs_module_removed_paths,
+                     *me._hdfs_module_curr_paths, *me._hdfs_module_target_paths,
+                     *me._hdfs_module_added_paths_html, *me._hdfs_module_removed_paths_html,
+                     *me._hdfs_module_curr_paths_html, *me._hdfs_module_target_paths_html],
+                    [*me._local_module_added_paths, *me._local_module_removed_paths,
+                     *me._local_module_curr_paths, *me._local_module_target_paths,
+                     *me._local_module_added_paths_html, *me._local_module_removed_paths_html,
+                     *me._local_module_curr_paths_html, *me._local_module_target_paths_html])
         return True
     
     @staticmethod 
@@ -1178,13 +1179,13 @@ class SinaraDiffReport:
         
         fs.makedirs(me._diff_diff_report_dir)
         
-        list(map(fs.put, me._local_module_added_paths_html, me._diff_module_added_paths))
-        list(map(fs.put, me._local_module_removed_paths_html, me._diff_module_removed_paths))
-        list(map(fs.put, me._local_module_curr_paths_html, me._diff_module_curr_paths))
-        list(map(fs.put, me._local_module_target_paths_html, me._diff_module_target_paths))
-        list(map(fs.put, me._local_module_diff_paths, me._diff_module_diff_paths))
+        fs.put_many([*me._local_module_added_paths_html, *me._local_module_removed_paths_html,
+                     *me._local_module_curr_paths_html, *me._local_module_target_paths_html,
+                     *me._local_module_diff_paths, me._local_diff_info_path],
+                    [*me._diff_module_added_paths, *me._diff_module_removed_paths,
+                     *me._diff_module_curr_paths, *me._diff_module_target_paths,
+                     *me._diff_module_diff_paths, me._diff_diff_info_path])
         
-        fs.put(me._local_diff_info_path,  me._diff_diff_info_path )
         fs.put(me._local_success_file_path, me._diff_success_file_path )
     
     @staticmethod
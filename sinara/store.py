@@ -1,10 +1,127 @@
 from .fs import SinaraFileSystem
+from .settings import _SinaraSettings
 from os import path, makedirs
 from pathlib import Path
+import os
+import fnmatch
+from concurrent.futures import ThreadPoolExecutor
 import tarfile
+import queue
+import heapq
+import json
+import threading
 
-import glob
 
+# Streaming tar pipeline: size of blocks passed between tar and the store and number of blocks buffered in memory
+STREAM_BLOCK_SIZE = 1024 * 1024
+STREAM_BUFFER_BLOCKS = 16
+
+# Sharded layout: files are split between tar shards listed in the manifest
+SHARDS_MANIFEST_FILE_NAME = 'files.manifest.json'
+# Member index stored next to every tar: name, data offset, size, mode and mtime of files
+TAR_INDEX_SUFFIX = '.index.json'
+
+def get_shard_workers():
+    if hasattr(_SinaraSettings, 'get_storage_unpack_workers'):
+        return _SinaraSettings.get_storage_unpack_workers()
+    else:
+        return 4
+
+class _SinaraStorePipe:
+    """
+    Bounded in-memory buffer between the tar stream and the store file.
+    One side is driven by tarfile, the other one by a thread copying blocks to or from the store file.
+    """
+
+    def __init__(self, max_blocks=STREAM_BUFFER_BLOCKS):
+        self._queue = queue.Queue(maxsize=max_blocks)
+        self._buffer = memoryview(b'')
+        self._eof = False
+        self._aborted = threading.Event()
+        self.error = None
+
+    def write(self, data):
+        self._put(bytes(data))
+        return len(data)
+
+    def read(self, size=-1):
+        chunks = []
+        while not self._eof and size != 0:
+            if not self._buffer:
+                block = self._queue.get()
+                if block is None:
+                    self._eof = True
+                    break
+                self._buffer = memoryview(block)
+            chunk = self._buffer if size < 0 else self._buffer[:size]
+            self._buffer = self._buffer[len(chunk):]
+            chunks.append(bytes(chunk))
+            if size > 0:
+                size -= len(chunk)
+        if self.error:
+            raise self.error
+        return b''.join(chunks)
+
+    def close(self):
+        """
+        Marks the end of the stream, called by the writing side
+        """
+        self._put(None)
+
+    def abort(self, error=None):
+        """
+        Stops the stream, called by the reading side, so the writing side is never blocked on the full buffer
+        """
+        self.error = self.error or error
+        self._aborted.set()
+
+    @property
+    def aborted(self):
+        return self._aborted.is_set()
+
+    def _put(self, block):
+        while not self._aborted.is_set():
+            try:
+                self._queue.put(block, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+        if block is not None:
+            raise self.error or Exception("Stream is aborted by the reading side")
+
+def _match_file_globs(name, file_globs):
+    """
+        the archived file matches by its path relative to tmp_dir or by the path of any of its parent directories,
+        as archive_tmp_files_to_store archives all files of the matching directory
+    """
+    if file_globs == ['*']:
+        return True
+    parts = Path(name.lstrip('/')).parts
+    names = ['/'.join(parts[:x]) for x in range(1, len(parts) + 1)]
+    return any(fnmatch.fnmatchcase(x, gl.lstrip('/')) for x in names for gl in file_globs)
+
+def _copy_to_pipe(src, pipe):
+    try:
+        while not pipe.aborted:
+            block = src.read(STREAM_BLOCK_SIZE)
+            if not block:
+                break
+            pipe.write(block)
+    except Exception as e:
+        if not pipe.aborted:
+            pipe.error = e
+    finally:
+        pipe.close()
+
+def _copy_from_pipe(pipe, dst):
+    try:
+        while True:
+            block = pipe.read(STREAM_BLOCK_SIZE)
+            if not block:
+                break
+            dst.write(block)
+    except Exception as e:
+        pipe.abort(e)
 
 class SinaraStore:
     """
@@ -21,54 +138,225 @@ class SinaraStore:
 
         
     @staticmethod
-    def archive_tmp_files_to_store(tmp_dir=str, store_path=str, file_globs=["*"]):
+    def archive_tmp_files_to_store(tmp_dir=str, store_path=str, file_globs=["*"], streaming=False, shards=None):
         """
             upload list of files from data temporary directory to store
-            subfolders are not supported
+            file_globs are matched by fnmatch against paths relative to tmp_dir, '*' matches '/' too,
+            matched subfolders are added with all their files, the same matching selects files to dearchive
+            streaming - pipe tar output straight into the store file through a bounded buffer,
+                        no intermediate tar file is written to tmp_dir
+            shards - number of tar shards balanced by size of files and written in parallel,
+                     single files.tar if None
         """        
         if isinstance(file_globs, str):
             file_globs = [file_globs]
             
-        filenames = []
-        for gl in file_globs:
-            filenames += glob.glob(str(Path(tmp_dir, gl)))
+        filenames = sorted(str(x) for x in Path(tmp_dir).rglob('*')
+                           if x.is_file() and _match_file_globs(str(x.relative_to(tmp_dir)), file_globs))
         if len(filenames) == 0:
             raise Exception("file_globs doesn't match any file")
         
         fs = SinaraFileSystem.FileSystem()
         fs.makedirs(store_path)
-        tar_file_path = f'{tmp_dir}/files.tar'
-        with tarfile.open(tar_file_path, 'w') as tar:
-            for tmp_file_path in filenames:
-                tar.add(tmp_file_path, arcname=tmp_file_path.replace(tmp_dir, ''))
-
-        store_file_path = str(Path(store_path, Path(tar_file_path).name))
-        fs.put(tar_file_path, store_file_path)
+        if shards:
+            SinaraStore._archive_shards(tmp_dir, filenames, store_path, shards, streaming)
+        else:
+            SinaraStore._archive_tar(tmp_dir, filenames, str(Path(store_path, 'files.tar')), streaming)
         fs.touch(Path(store_path, '_SUCCESS'))
-        Path(tar_file_path).unlink()
         
         
     @staticmethod
-    def dearchive_store_files_to_tmp(store_path=str, tmp_dir=str, file_globs=["*"]):
+    def dearchive_store_files_to_tmp(store_path=str, tmp_dir=str, file_globs=["*"], streaming=False):
         """
             download list of files from data temporary directory to store
-            subfolders are not supported
+            file_globs are matched against paths of archived files relative to tmp_dir and their parent directories,
+            only matching files are extracted, by ranged reads of the tar if the store has the member index
+            or while the whole tar is read otherwise
+            streaming - extract tar straight from the store file read through a bounded buffer,
+                        no local copy of the tar file is made
+            sharded layout is detected by the manifest, shards are downloaded in parallel
+            and every shard is extracted as soon as its download finishes
         """ 
         if isinstance(file_globs, str):
             file_globs = [file_globs]
         
         fs = SinaraFileSystem.FileSystem()
-        
-        filenames = []
-        for gl in file_globs:
-            filenames += fs.glob(str(Path(store_path, gl)))
-        if len(filenames) == 0:
-            raise Exception("file_globs doesn't match any file")
-        
         fs.makedirs(tmp_dir)
-        store_file_path = str(Path(store_path, 'files.tar'))
+        manifest_path = str(Path(store_path, SHARDS_MANIFEST_FILE_NAME))
+        tar_names = ['files.tar']
+        if fs.exists(manifest_path):
+            tar_names = list(SinaraStore._read_store_json(manifest_path, tmp_dir)['shards'])
+
+        if file_globs != ['*'] and all(fs.exists(str(Path(store_path, x + TAR_INDEX_SUFFIX))) for x in tar_names):
+            members = []
+            for tar_name in tar_names:
+                tar_index = SinaraStore._read_store_json(str(Path(store_path, tar_name + TAR_INDEX_SUFFIX)), tmp_dir)
+                members += [(str(Path(store_path, tar_name)), x) for x in tar_index['members']
+                            if _match_file_globs(x['name'], file_globs)]
+            if len(members) == 0:
+                raise Exception("file_globs doesn't match any file")
+            with ThreadPoolExecutor(max_workers=get_shard_workers()) as pool:
+                list(pool.map(lambda x: SinaraStore._extract_member(x[0], x[1], tmp_dir), members))
+            return
+
+        with ThreadPoolExecutor(max_workers=get_shard_workers()) as pool:
+            extracted = list(pool.map(lambda x: SinaraStore._dearchive_tar(str(Path(store_path, x)), tmp_dir, file_globs, streaming),
+                                      tar_names))
+        if sum(extracted) == 0:
+            raise Exception("file_globs doesn't match any file")
+
+    @staticmethod
+    def _archive_tar(tmp_dir, filenames, store_file_path, streaming):
+        """
+            writes the tar and its member index next to it
+        """
+        if streaming:
+            members = SinaraStore._stream_tar_to_store(tmp_dir, filenames, store_file_path)
+        else:
+            fs = SinaraFileSystem.FileSystem()
+            tar_file_path = f'{tmp_dir}/{Path(store_file_path).name}'
+            with tarfile.open(tar_file_path, 'w') as tar:
+                members = SinaraStore._add_files(tar, tmp_dir, filenames)
+            fs.put(tar_file_path, store_file_path)
+            Path(tar_file_path).unlink()
+        SinaraStore._write_store_json({'members': members}, store_file_path + TAR_INDEX_SUFFIX, tmp_dir)
+
+    @staticmethod
+    def _add_files(tar, tmp_dir, filenames):
+        """
+            data of the member starts after its header and ends at the block boundary the tar offset is at
+            @return member index of added files
+        """
+        members = []
+        for tmp_file_path in filenames:
+            tarinfo = tar.gettarinfo(tmp_file_path, arcname=tmp_file_path.replace(tmp_dir, ''))
+            with open(tmp_file_path, 'rb') as f_id:
+                tar.addfile(tarinfo, f_id)
+            blocks_size = -(-tarinfo.size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+            members.append({'name': tarinfo.name, 'offset': tar.offset - blocks_size, 'size': tarinfo.size,
+                            'mode': tarinfo.mode, 'mtime': tarinfo.mtime})
+        return members
+
+    @staticmethod
+    def _extract_member(store_file_path, member, tmp_dir):
+        """
+            reads data of the member by its offset in the tar
+        """
+        fs = SinaraFileSystem.FileSystem()
+        tmp_file_path = Path(tmp_dir, member['name'].lstrip('/'))
+        tmp_file_path.parent.mkdir(parents=True, exist_ok=True)
+        with fs.open(store_file_path, 'rb') as src, open(tmp_file_path, 'wb') as dst:
+            src.seek(member['offset'])
+            remaining = member['size']
+            while remaining > 0:
+                block = src.read(min(STREAM_BLOCK_SIZE, remaining))
+                if not block:
+                    raise Exception(f"Unexpected end of '{store_file_path}' reading '{member['name']}'")
+                dst.write(block)
+                remaining -= len(block)
+        os.chmod(tmp_file_path, member['mode'])
+        os.utime(tmp_file_path, (member['mtime'], member['mtime']))
+
+    @staticmethod
+    def _write_store_json(content, store_file_path, tmp_dir):
+        fs = SinaraFileSystem.FileSystem()
+        json_file_path = f'{tmp_dir}/{Path(store_file_path).name}'
+        with open(json_file_path, 'w') as f_id:
+            json.dump(content, f_id)
+        fs.put(json_file_path, store_file_path)
+        Path(json_file_path).unlink()
+
+    @staticmethod
+    def _read_store_json(store_file_path, tmp_dir):
+        fs = SinaraFileSystem.FileSystem()
+        json_file_path = f'{tmp_dir}/{Path(store_file_path).name}'
+        fs.get(store_file_path, json_file_path)
+        with open(json_file_path) as f_id:
+            content = json.load(f_id)
+        Path(json_file_path).unlink()
+        return content
+
+    @staticmethod
+    def _dearchive_tar(store_file_path, tmp_dir, file_globs, streaming):
+        """
+            @return number of extracted members matching file_globs
+        """
+        if streaming:
+            return SinaraStore._stream_tar_from_store(store_file_path, tmp_dir, file_globs)
+        fs = SinaraFileSystem.FileSystem()
         tar_file_path = str(Path(tmp_dir, Path(store_file_path).name))
         fs.get(store_file_path, tar_file_path)
         with tarfile.open(tar_file_path) as tar:
-            tar.extractall(tmp_dir)
+            members = [x for x in tar if _match_file_globs(x.name, file_globs)]
+            tar.extractall(tmp_dir, members=members)
         Path(tar_file_path).unlink()
+        return len(members)
+
+    @staticmethod
+    def _archive_shards(tmp_dir, filenames, store_path, shards, streaming):
+        """
+            files are bin-packed by size into shards, every shard is written by the thread pool
+            and the manifest of files by shard name is written last
+        """
+        shards = max(1, min(shards, len(filenames)))
+        shard_files = [[] for _ in range(shards)]
+        loads = [(0, x) for x in range(shards)]
+        sizes = {x: Path(x).stat().st_size for x in filenames}
+        for tmp_file_path in sorted(filenames, key=sizes.get, reverse=True):
+            load, shard_num = heapq.heappop(loads)
+            shard_files[shard_num].append(tmp_file_path)
+            heapq.heappush(loads, (load + sizes[tmp_file_path], shard_num))
+
+        manifest = {'shards': {f'files-{x:04d}.tar': [y.replace(tmp_dir, '') for y in shard_files[x]] for x in range(shards)}}
+        with ThreadPoolExecutor(max_workers=get_shard_workers()) as pool:
+            list(pool.map(lambda x: SinaraStore._archive_tar(tmp_dir, shard_files[x], str(Path(store_path, f'files-{x:04d}.tar')), streaming),
+                          range(shards)))
+
+        SinaraStore._write_store_json(manifest, str(Path(store_path, SHARDS_MANIFEST_FILE_NAME)), tmp_dir)
+
+    @staticmethod
+    def _stream_tar_to_store(tmp_dir, filenames, store_file_path):
+        """
+            tar is written to the pipe while the thread copies its blocks to the store file
+            @return member index of the tar
+        """
+        fs = SinaraFileSystem.FileSystem()
+        pipe = _SinaraStorePipe()
+        with fs.open(store_file_path, 'wb') as store_file:
+            writer = threading.Thread(target=_copy_from_pipe, args=(pipe, store_file), daemon=True)
+            writer.start()
+            try:
+                with tarfile.open(fileobj=pipe, mode='w|', bufsize=STREAM_BLOCK_SIZE) as tar:
+                    members = SinaraStore._add_files(tar, tmp_dir, filenames)
+            finally:
+                pipe.close()
+                writer.join()
+        if pipe.error:
+            raise pipe.error
+        return members
+
+    @staticmethod
+    def _stream_tar_from_store(store_file_path, tmp_dir, file_globs):
+        """
+            the thread reads blocks of the store file to the pipe while tar is extracted from it
+            @return number of extracted members matching file_globs
+        """
+        extracted = 0
+        fs = SinaraFileSystem.FileSystem()
+        pipe = _SinaraStorePipe()
+        with fs.open(store_file_path, 'rb') as store_file:
+            reader = threading.Thread(target=_copy_to_pipe, args=(store_file, pipe), daemon=True)
+            reader.start()
+            try:
+                with tarfile.open(fileobj=pipe, mode='r|', bufsize=STREAM_BLOCK_SIZE) as tar:
+                    for member in tar:
+                        if _match_file_globs(member.name, file_globs):
+                            tar.extract(member, tmp_dir)
+                            extracted += 1
+            finally:
+                # the reading thread is stopped if extraction doesn't consume the stream to the end
+                pipe.abort()
+                reader.join()
+        if pipe.error:
+            raise pipe.error
+        return extracted
@@ -11,6 +11,7 @@ import inspect
 import pprint
 import json
 import atexit
+import threading
 import sys, traceback
 
 from IPython.core.display import Markdown, display
@@ -315,6 +316,8 @@ class NotebookSubstep:
         
         self.registered_tmp_entities = {}
 
+        # reader of every input read by read_input: 'arrow' or 'spark'
+        self.input_readers = {}
 
         self._commit = str(git.Repo().commit("HEAD"))
         self._origin = next(git.Repo().remotes.origin.urls)
@@ -490,6 +493,7 @@ class NotebookSubstep:
         run_info["inputs"] = self.registered_inputs
         run_info["outputs"] = self.registered_outputs
         run_info["tmp"] = {**self.registered_tmp_inputs, **self.registered_tmp_outputs, **self.registered_tmp_entities}
+        run_info["input_readers"] = self.input_readers
         run_info["status"] = 'RUNNING'
         run_info["duration"] = f"{stop_time - start_time}"
         run_info["origin"] = self._origin
@@ -697,14 +701,7 @@ class NotebookSubstep:
         
         fs = SinaraFileSystem.FileSystem()
 
-        entity_paths = fs.glob(f"{step_path}/*/{entity_name}/_SUCCESS")
-
-        run_ids = sorted([entity_path.split("/")[-3] for entity_path in entity_paths])
-
-        if len(run_ids) > 0:
-            return run_ids[-1]
-        else:
-            return None
+        return fs.last_run_id(step_path, entity_name)
 
     def last_run_id(self, step_name, env_name, pipeline_name, zone_name, entity_name):
         """ Get the last run id stored on FS.
@@ -1027,7 +1024,54 @@ class NotebookSubstep:
                                                     bases=(DSMLUrls,),
                                                     frozen=True)()
         return registered_inputs
-            
+
+    def load_inputs(self, step_name, as_='pandas', spark=None, **kwargs):
+        """
+        Reads all parquet inputs of the step concurrently by read_input
+        @param step_name - name of the step, other filters of inputs are passed by kwargs as to inputs
+        @param as_ - 'pandas' for pandas DataFrames or 'arrow' for pyarrow Tables
+        @param spark - Apache Spark session for large inputs, the active session or one run by SinaraSpark.run_session
+                       if None, the session is taken once before inputs are read, so all readers share it
+        @return dataclass with the data of inputs by entity names
+        """
+        if as_ not in ('pandas', 'arrow'):
+            raise Exception(f"Unexpected as_ value: '{as_}', expected 'pandas' or 'arrow'")
+        input_urls = self.inputs(step_name=step_name, **kwargs)
+        entity_names = [x.name for x in dataclasses.fields(input_urls) if hasattr(input_urls, f'full_{x.name}')]
+        urls = [getattr(input_urls, x) for x in entity_names]
+
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=max(1, len(entity_names))) as pool:
+            sizes = list(pool.map(_parquet_size, urls))
+            if spark is None and any(_input_reader(x) == 'spark' for x in sizes):
+                spark = _spark_session()
+            data = list(pool.map(lambda x: self._read_input(x[0], as_, spark, x[1]), zip(urls, sizes)))
+
+        data_type = _data_type(as_)
+        input_data = dataclasses.make_dataclass('InputData', [(name, data_type) for name in entity_names], frozen=True)
+        return input_data(*data)
+
+    def read_input(self, input_url, as_='pandas', spark=None):
+        """
+        Reads the parquet input by pyarrow with memory mapping if its uncompressed size taken from parquet metadata
+        is within get_input_arrow_max_size(), large inputs are read by Apache Spark with Arrow enabled.
+        The reader taken is recorded in runinfo 'input_readers'
+        @param input_url - url of the input
+        @param as_ - 'pandas' for pandas DataFrame or 'arrow' for pyarrow Table
+        @param spark - Apache Spark session for large inputs, the active session or one run by SinaraSpark.run_session if None
+        """
+        if as_ not in ('pandas', 'arrow'):
+            raise Exception(f"Unexpected as_ value: '{as_}', expected 'pandas' or 'arrow'")
+        return self._read_input(input_url, as_, spark, _parquet_size(input_url))
+
+    def _read_input(self, input_url, as_, spark, size):
+        reader = _input_reader(size)
+        self.input_readers[str(input_url)] = {'reader': reader, 'size': size}
+        logging.info(f"Reading input '{input_url}' of size {size} by {reader}")
+        if reader == 'arrow':
+            return _read_parquet_by_arrow(input_url, as_)
+        return _read_parquet_by_spark(input_url, as_, spark)
+
     def outputs(self, *, env_name="curr_env_name", pipeline_name="curr_pipeline_name", zone_name="curr_zone_name"):     
         """Substep outputs
 
@@ -1226,11 +1270,90 @@ class NotebookSubstep:
         env_name = log_env if log_env else self._env_name
         env_path = _SinaraSettings.get_env_path(env_name)
         step_path = f"{env_path}/{self._pipeline_name}/{self._zone_name}/{self._step_name}"
-        log_events = fs.glob(f"{step_path}/**/tensorboard/{log_name}/events.out*")
+        # logs are saved by StepReport.save to <step_path>/<run_id>/tensorboard/<log_name>, so a single run level is globbed,
+        # '**' matched the same level on the local filesystem but made s3 list the whole step recursively
+        log_events = fs.glob(f"{step_path}/*/tensorboard/{log_name}/events.out*")
+        tmp_paths = []
         for log_path in log_events:
             events_file = Path(log_path).name
             run_id = Path(log_path).parts[-4]
             tmp_path = f"{tmp_log_dir}/{run_id}/{events_file}"
             os.makedirs(f"{tmp_log_dir}/{run_id}", exist_ok=True)
             print(f"Copying previous logs from {log_path} to {tmp_path}", flush=True)
-            fs.get(log_path, tmp_path)
+            tmp_paths.append(tmp_path)
+        fs.get_many(log_events, tmp_paths)
+
+def get_input_arrow_max_size():
+    if hasattr(_SinaraSettings, 'get_input_arrow_max_size'):
+        return _SinaraSettings.get_input_arrow_max_size()
+    else:
+        return 512 * 1024 * 1024
+
+def _data_type(as_):
+    if as_ == 'arrow':
+        import pyarrow as pa
+        return pa.Table
+    import pandas as pd
+    return pd.DataFrame
+
+def _input_reader(size):
+    return 'arrow' if size is not None and size <= get_input_arrow_max_size() else 'spark'
+
+# Apache Spark session run for reading inputs is run once, concurrent readers wait for it
+_spark_session_lock = threading.Lock()
+
+def _spark_session():
+    """
+    @return the active Apache Spark session, the session is run by SinaraSpark.run_session only if there is none,
+            as running the session stops the current one
+    """
+    from pyspark.sql import SparkSession
+    with _spark_session_lock:
+        spark = SparkSession.getActiveSession()
+        if spark is not None:
+            return spark
+        from .spark import SinaraSpark
+        if SinaraSpark.session_is_stopped():
+            return SinaraSpark.run_session(0)
+        # the active session is thread local, threads of the pool get the running session by the builder
+        return SparkSession.builder.getOrCreate()
+
+def _parquet_size(url):
+    """
+    @return total uncompressed size of row groups of the parquet dataset at url taken from the footers,
+            None if the dataset can't be inspected by pyarrow
+    """
+    try:
+        import pyarrow.dataset as ds
+        from .arrow_archive import _arrow_filesystem
+        filesystem, base_path = _arrow_filesystem(url)
+        dataset = ds.dataset(base_path, format='parquet', filesystem=filesystem)
+        size = 0
+        for fragment in dataset.get_fragments():
+            metadata = fragment.metadata
+            size += sum(metadata.row_group(i).total_byte_size for i in range(metadata.num_row_groups))
+        return size
+    except Exception as e:
+        logging.info(f"Can't read parquet metadata of '{url}': {e}")
+        return None
+
+def _read_parquet_by_arrow(url, as_):
+    import pyarrow.parquet as pq
+    from .arrow_archive import _arrow_filesystem
+    # memory mapping applies to local files only
+    filesystem, base_path = _arrow_filesystem(url)
+    table = pq.read_table(base_path, filesystem=filesystem, memory_map=True)
+    return table if as_ == 'arrow' else table.to_pandas()
+
+def _read_parquet_by_spark(url, as_, spark=None):
+    if spark is None:
+        # the session is taken on demand, so steps reading small inputs only don't start Apache Spark
+        spark = _spark_session()
+    spark.conf.set("spark.sql.execution.arrow.pyspark.enabled", "true")
+    df = spark.read.parquet(str(url))
+    if as_ == 'arrow':
+        if hasattr(df, 'toArrow'):
+            return df.toArrow()
+        import pyarrow as pa
+        return pa.Table.from_pandas(df.toPandas(), preserve_index=False)
+    return df.toPandas()
@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+# infra is resolved once on import of sinara, tests of other infras patch their modules
+os.environ.setdefault('INFRA_NAME', 'local_filesystem')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def work_dir(tmp_path, monkeypatch):
+    """
+    Step directory of the test, temporary paths of sinara are made inside of it
+    """
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,102 @@
+import os
+
+import pytest
+
+pq = pytest.importorskip('pyarrow.parquet')
+
+from sinara.archive import SinaraArchive
+from sinara.arrow_archive import SinaraArrowArchive
+
+def _make_files(tmp_entity_dir, files_count, file_size):
+    os.makedirs(tmp_entity_dir)
+    for i in range(files_count):
+        with open(tmp_entity_dir / f'f{i}.bin', 'wb') as f_id:
+            f_id.write(os.urandom(file_size))
+
+def _count_row_group_reads(monkeypatch):
+    reads = []
+    read_row_group = pq.ParquetFile.read_row_group
+
+    def counting_read_row_group(self, *args, **kwargs):
+        reads.append(args[0])
+        return read_row_group(self, *args, **kwargs)
+
+    monkeypatch.setattr(pq.ParquetFile, 'read_row_group', counting_read_row_group)
+    return reads
+
+def _row_groups_count(store_path):
+    return sum(pq.ParquetFile(store_path / x).num_row_groups
+               for x in os.listdir(store_path) if x.endswith('.parquet'))
+
+def test_plan_partitions_are_relpath_ranges(work_dir, monkeypatch):
+    monkeypatch.setattr(SinaraArchive, 'ROW_SIZE', 1024)
+    monkeypatch.setattr(SinaraArchive, 'BLOCK_SIZE', 10 * 1024)
+    _make_files(work_dir / 'src', 10, 10 * 1024)
+
+    plan = SinaraArrowArchive().plan(str(work_dir / 'src'))
+
+    assert len(plan.partitions) == 10
+    rel_paths = [chunk.relPath for partition in plan.partitions for chunk in partition]
+    assert rel_paths == sorted(rel_paths)
+
+def test_selective_include_reads_fewer_row_groups(work_dir, monkeypatch):
+    monkeypatch.setattr(SinaraArchive, 'ROW_SIZE', 1024)
+    monkeypatch.setattr(SinaraArchive, 'BLOCK_SIZE', 10 * 1024)
+    _make_files(work_dir / 'src', 10, 10 * 1024)
+    store_path = work_dir / 'store'
+    archive = SinaraArrowArchive()
+    archive.pack_files_from_tmp_to_store(str(work_dir / 'src'), str(store_path))
+    reads = _count_row_group_reads(monkeypatch)
+
+    archive.unpack_files_from_store_to_tmp(str(store_path), str(work_dir / 'dst'), include=['f3.bin'])
+
+    assert 0 < len(reads) < _row_groups_count(store_path)
+    assert os.listdir(work_dir / 'dst') == ['f3.bin']
+    with open(work_dir / 'src' / 'f3.bin', 'rb') as src, open(work_dir / 'dst' / 'f3.bin', 'rb') as dst:
+        assert src.read() == dst.read()
+
+def test_open_reads_each_row_group_once(work_dir, monkeypatch):
+    monkeypatch.setattr(SinaraArchive, 'ROW_SIZE', 1024)
+    monkeypatch.setattr(SinaraArchive, 'BLOCK_SIZE', 10 * 1024)
+    _make_files(work_dir / 'src', 10, 10 * 1024)
+    store_path = work_dir / 'store'
+    SinaraArrowArchive().pack_files_from_tmp_to_store(str(work_dir / 'src'), str(store_path))
+    reads = _count_row_group_reads(monkeypatch)
+
+    with SinaraArchive.open(str(store_path), 'f3.bin') as f_id:
+        content = f_id.read()
+
+    with open(work_dir / 'src' / 'f3.bin', 'rb') as src:
+        assert content == src.read()
+    assert 0 < len(reads) < _row_groups_count(store_path)
+    assert len(reads) == len(set(reads))
+
+@pytest.mark.parametrize('checksum', [True, False])
+def test_unpack_raises_on_missing_parquet_file(work_dir, monkeypatch, checksum):
+    monkeypatch.setattr(SinaraArchive, 'ROW_SIZE', 1024)
+    monkeypatch.setattr(SinaraArchive, 'BLOCK_SIZE', 10 * 1024)
+    _make_files(work_dir / 'src', 10, 10 * 1024)
+    store_path = work_dir / 'store'
+    archive = SinaraArrowArchive()
+    archive.pack_files_from_tmp_to_store(str(work_dir / 'src'), str(store_path), checksum=checksum)
+    os.remove(store_path / sorted(x for x in os.listdir(store_path) if x.endswith('.parquet'))[3])
+
+    with pytest.raises(Exception, match='missing'):
+        archive.unpack_files_from_store_to_tmp(str(store_path), str(work_dir / 'dst'))
+
+def test_streaming_write_raises_on_missing_parts(work_dir):
+    from sinara.archive import SinaraArchive_write_partition, _parts_counts, _preallocate_file, _verify_written_parts
+    from sinara.arrow_archive import SinaraArrowArchiveRow
+    rows = [('/f.bin.parts/part-0000', 4), ('/f.bin.parts/part-0001', 4), ('/f.bin.parts/part-0002', 2), ('/f.bin.parts/_PARTS', 0)]
+    os.makedirs(work_dir / 'dst')
+    _preallocate_file(str(work_dir / 'dst' / 'f.bin'), 10)
+
+    # the middle part is lost, the preallocated file keeps its size
+    written_parts = SinaraArchive_write_partition([SinaraArrowArchiveRow(rows[x][0], b'x' * rows[x][1], None) for x in (0, 2, 3)],
+                                                  str(work_dir / 'dst'), {'f.bin': 4}, 2)
+
+    assert written_parts == [('f.bin', 2)]
+    assert os.path.getsize(work_dir / 'dst' / 'f.bin') == 10
+    with pytest.raises(Exception, match='missing'):
+        _verify_written_parts(_parts_counts(rows), written_parts)
+    _verify_written_parts(_parts_counts(rows), written_parts + [('f.bin', 1)])
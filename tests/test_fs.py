@@ -0,0 +1,23 @@
+import os
+import sys
+import subprocess
+
+def test_infra_without_async_file_system_gets_generic_one(tmp_path):
+    # infra packages are resolved on import of sinara.fs, so it is imported in a process of its own
+    code = '\n'.join([
+        "import sys, types",
+        "import sinara.fs",
+        "from sinara.infra.local_filesystem.fs.fs import SinaraLocalFileSystem",
+        "module = types.ModuleType('sinara.infra.out_of_tree.fs')",
+        "module.SinaraFileSystem = SinaraLocalFileSystem",
+        "sys.modules['sinara.infra.out_of_tree'] = types.ModuleType('sinara.infra.out_of_tree')",
+        "sys.modules['sinara.infra.out_of_tree.fs'] = module",
+        "import os; os.environ['INFRA_NAME'] = 'out_of_tree'",
+        "del sys.modules['sinara.fs']",
+        "from sinara.fs import AsyncSinaraFileSystem",
+        f"print(AsyncSinaraFileSystem.FileSystem().exists_many([{str(tmp_path)!r}]))",
+    ])
+    env = dict(os.environ, INFRA_NAME='local_filesystem', PYTHONPATH=os.pathsep.join(sys.path))
+    result = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().splitlines()[-1] == '[True]'
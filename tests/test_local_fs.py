@@ -0,0 +1,70 @@
+import os
+import errno
+
+import pytest
+
+from sinara.fs import SinaraFileSystem
+from sinara.infra.local_filesystem.fs import fs as local_fs
+
+def _make_run(step_path, run_id, entity_name):
+    os.makedirs(step_path / run_id / entity_name)
+    (step_path / run_id / entity_name / '_SUCCESS').touch()
+
+def _count_listdir(monkeypatch):
+    calls = []
+    listdir = os.listdir
+
+    def counting_listdir(path):
+        calls.append(path)
+        return listdir(path)
+
+    monkeypatch.setattr(local_fs.os, 'listdir', counting_listdir)
+    return calls
+
+def test_last_run_id_is_served_from_run_index(work_dir, monkeypatch):
+    step_path = work_dir / 'step'
+    _make_run(step_path, 'run-24-01-01-000000', 'entity')
+    _make_run(step_path, 'run-24-01-02-000000', 'entity')
+    _make_run(step_path, 'run-24-01-03-000000', 'other')
+    fs = SinaraFileSystem.FileSystem()
+    calls = _count_listdir(monkeypatch)
+
+    assert fs.last_run_id(str(step_path), 'entity') == 'run-24-01-02-000000'
+    assert fs.last_run_id(str(step_path), 'entity') == 'run-24-01-02-000000'
+    assert fs.last_run_id(str(step_path), 'other') == 'run-24-01-03-000000'
+    assert len(calls) == 1
+
+def test_last_run_id_rescans_stale_run_index(work_dir):
+    step_path = work_dir / 'step'
+    _make_run(step_path, 'run-24-01-01-000000', 'entity')
+    fs = SinaraFileSystem.FileSystem()
+    assert fs.last_run_id(str(step_path), 'entity') == 'run-24-01-01-000000'
+
+    # _SUCCESS written bypassing the filesystem, as Apache Spark does
+    _make_run(step_path, 'run-24-01-02-000000', 'entity')
+    assert fs.last_run_id(str(step_path), 'entity') == 'run-24-01-02-000000'
+
+    os.remove(step_path / 'run-24-01-02-000000' / 'entity' / '_SUCCESS')
+    assert fs.last_run_id(str(step_path), 'entity') == 'run-24-01-01-000000'
+    assert fs.last_run_id(str(work_dir / 'missing'), 'entity') is None
+
+def _failing_strategy(error_number):
+    def _reflink(src, dst, size):
+        raise OSError(error_number, os.strerror(error_number))
+    return _reflink
+
+def test_copy_marks_strategy_unsupported_only_for_unsupported_errors(work_dir, monkeypatch):
+    with open(work_dir / 'src', 'wb') as f_id:
+        f_id.write(b'content')
+    monkeypatch.setattr(local_fs, '_unsupported_strategies', set())
+
+    monkeypatch.setattr(local_fs, 'TRANSFER_STRATEGIES', [_failing_strategy(errno.ENOSPC), local_fs._buffered_copy])
+    with pytest.raises(OSError):
+        local_fs._copy_file(str(work_dir / 'src'), str(work_dir / 'dst'))
+    assert not local_fs._unsupported_strategies
+
+    monkeypatch.setattr(local_fs, 'TRANSFER_STRATEGIES', [_failing_strategy(errno.EXDEV), local_fs._buffered_copy])
+    local_fs._copy_file(str(work_dir / 'src'), str(work_dir / 'dst'))
+    with open(work_dir / 'dst', 'rb') as f_id:
+        assert f_id.read() == b'content'
+    assert [x for x, _ in local_fs._unsupported_strategies] == ['_reflink']
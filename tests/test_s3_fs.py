@@ -0,0 +1,101 @@
+import os
+
+import pytest
+
+moto_server = pytest.importorskip('moto.server')
+pytest.importorskip('s3fs')
+
+import sinara.fs  # infra modules are imported through sinara.fs
+from sinara.infra.s3.fs import fs as s3_fs
+from sinara.infra.s3.settings.settings import _SinaraSettings as _SinaraS3Settings
+
+BUCKET = 'sinara-test'
+PART_SIZE = 5 * 1024 * 1024
+
+@pytest.fixture(scope='module')
+def s3_endpoint_url():
+    server = moto_server.ThreadedMotoServer(ip_address='127.0.0.1', port=0, verbose=False)
+    server.start()
+    host, port = server.get_host_and_port()
+    yield f'http://{host}:{port}'
+    server.stop()
+
+@pytest.fixture
+def fs(s3_endpoint_url, monkeypatch):
+    """
+    File system of the s3 infra on the moto server, S3 requires parts of multipart uploads of 5 MB at least
+    """
+    monkeypatch.setenv('SINARA_S3_ENDPOINT_URL', s3_endpoint_url)
+    monkeypatch.setenv('SINARA_S3_ACCESS_KEY_ID', 'key')
+    monkeypatch.setenv('SINARA_S3_SECRET_ACCESS_KEY', 'secret')
+    monkeypatch.setenv('SINARA_S3_PART_SIZE', str(PART_SIZE))
+    monkeypatch.setenv('SINARA_S3_TRANSFER_WORKERS', '4')
+    monkeypatch.setattr(s3_fs, '_SinaraSettings', _SinaraS3Settings)
+    monkeypatch.setattr(s3_fs, '_s3', None)
+    s3 = s3_fs._get_s3()
+    if not s3.exists(BUCKET):
+        s3.mkdir(BUCKET)
+    return s3_fs.SinaraS3FileSystem.FileSystem()
+
+def _write_file(file_path, size):
+    content = os.urandom(size)
+    with open(file_path, 'wb') as f_id:
+        f_id.write(content)
+    return content
+
+def _read_file(file_path):
+    with open(file_path, 'rb') as f_id:
+        return f_id.read()
+
+def test_put_and_get_small_file(fs, tmp_path):
+    content = _write_file(tmp_path / 'src', 1024)
+
+    fs.put(str(tmp_path / 'src'), f's3://{BUCKET}/small/file')
+    fs.get(f's3://{BUCKET}/small/file', str(tmp_path / 'dst'))
+
+    assert _read_file(tmp_path / 'dst') == content
+    assert fs.exists(f's3://{BUCKET}/small/file')
+    assert fs.info(f's3://{BUCKET}/small/file')['size'] == 1024
+
+def test_multipart_put_and_ranged_parallel_get(fs, tmp_path, monkeypatch):
+    content = _write_file(tmp_path / 'src', 2 * PART_SIZE + 1234)
+    calls = {'create_multipart_upload': 0, 'upload_part': 0}
+    call_s3 = s3_fs._get_s3().call_s3
+
+    def counting_call_s3(method, *args, **kwargs):
+        if method in calls:
+            calls[method] += 1
+        return call_s3(method, *args, **kwargs)
+
+    monkeypatch.setattr(s3_fs._get_s3(), 'call_s3', counting_call_s3)
+    fs.put(str(tmp_path / 'src'), f's3://{BUCKET}/large/file')
+    assert calls == {'create_multipart_upload': 1, 'upload_part': 3}
+
+    ranges = []
+    cat_file = s3_fs._get_s3().cat_file
+
+    def counting_cat_file(path, start=None, end=None, **kwargs):
+        ranges.append((start, end))
+        return cat_file(path, start=start, end=end, **kwargs)
+
+    monkeypatch.setattr(s3_fs._get_s3(), 'cat_file', counting_cat_file)
+    fs.get(f's3://{BUCKET}/large/file', str(tmp_path / 'dst'))
+
+    assert _read_file(tmp_path / 'dst') == content
+    assert sorted(ranges) == [(0, PART_SIZE), (PART_SIZE, 2 * PART_SIZE), (2 * PART_SIZE, len(content))]
+
+def test_glob(fs, tmp_path):
+    _write_file(tmp_path / 'src', 10)
+    for key in ['glob/a.json', 'glob/b.json', 'glob/c.txt']:
+        fs.put(str(tmp_path / 'src'), f's3://{BUCKET}/{key}')
+
+    assert sorted(fs.glob(f's3://{BUCKET}/glob/*.json')) == [f's3://{BUCKET}/glob/a.json', f's3://{BUCKET}/glob/b.json']
+
+def test_last_run_id(fs):
+    step_path = f's3://{BUCKET}/step'
+    fs.touch(f'{step_path}/run-24-01-01-000000/entity/_SUCCESS')
+    fs.touch(f'{step_path}/run-24-01-02-000000/entity/_SUCCESS')
+    fs.touch(f'{step_path}/run-24-01-03-000000/other/_SUCCESS')
+
+    assert fs.last_run_id(step_path, 'entity') == 'run-24-01-02-000000'
+    assert fs.last_run_id(step_path, 'missing') is None
@@ -0,0 +1,49 @@
+import os
+
+import pytest
+
+from sinara.store import SinaraStore, TAR_INDEX_SUFFIX
+
+def _make_files(tmp_dir):
+    os.makedirs(tmp_dir / 'sub')
+    for name in ['a.txt', 'sub/b.json', 'sub/c.txt']:
+        with open(tmp_dir / name, 'w') as f_id:
+            f_id.write(name)
+
+def _dearchived_files(tmp_dir):
+    return sorted(str(x.relative_to(tmp_dir)) for x in tmp_dir.rglob('*') if x.is_file())
+
+@pytest.mark.parametrize('file_globs', [['sub/*.json'], ['sub'], ['*.txt']])
+@pytest.mark.parametrize('streaming', [False, True])
+def test_file_globs_match_same_files_with_and_without_index(work_dir, file_globs, streaming):
+    _make_files(work_dir / 'src')
+    store_path = str(work_dir / 'store')
+    SinaraStore.archive_tmp_files_to_store(str(work_dir / 'src'), store_path)
+
+    SinaraStore.dearchive_store_files_to_tmp(store_path, str(work_dir / 'indexed'), file_globs, streaming=streaming)
+    # stores written before the member index was added have no index
+    os.remove(work_dir / 'store' / f'files.tar{TAR_INDEX_SUFFIX}')
+    SinaraStore.dearchive_store_files_to_tmp(store_path, str(work_dir / 'not_indexed'), file_globs, streaming=streaming)
+
+    assert _dearchived_files(work_dir / 'indexed') == _dearchived_files(work_dir / 'not_indexed')
+    assert _dearchived_files(work_dir / 'indexed')
+
+def test_file_globs_not_matching_raise(work_dir):
+    _make_files(work_dir / 'src')
+    store_path = str(work_dir / 'store')
+    SinaraStore.archive_tmp_files_to_store(str(work_dir / 'src'), store_path)
+    os.remove(work_dir / 'store' / f'files.tar{TAR_INDEX_SUFFIX}')
+
+    with pytest.raises(Exception, match="doesn't match"):
+        SinaraStore.dearchive_store_files_to_tmp(store_path, str(work_dir / 'dst'), ['*.csv'])
+
+@pytest.mark.parametrize('file_globs', [['*.txt'], ['sub/*'], ['**/*.json']])
+def test_file_globs_select_same_files_to_archive_and_dearchive(work_dir, file_globs):
+    _make_files(work_dir / 'src')
+    SinaraStore.archive_tmp_files_to_store(str(work_dir / 'src'), str(work_dir / 'all'))
+    SinaraStore.archive_tmp_files_to_store(str(work_dir / 'src'), str(work_dir / 'selected'), file_globs)
+
+    SinaraStore.dearchive_store_files_to_tmp(str(work_dir / 'all'), str(work_dir / 'dearchived'), file_globs)
+    SinaraStore.dearchive_store_files_to_tmp(str(work_dir / 'selected'), str(work_dir / 'archived'))
+
+    assert _dearchived_files(work_dir / 'dearchived') == _dearchived_files(work_dir / 'archived')
@@ -0,0 +1,55 @@
+import dataclasses
+import threading
+
+import pytest
+
+pytest.importorskip('pyarrow')
+
+from sinara import substep
+
+def _substep_with_inputs(monkeypatch, entity_names):
+    notebook_substep = substep.NotebookSubstep.__new__(substep.NotebookSubstep)
+    notebook_substep.input_readers = {}
+    fields = [(x, str) for x in entity_names] + [(f'full_{x}', str) for x in entity_names]
+    input_urls = dataclasses.make_dataclass('InputUrls', fields)(*entity_names, *entity_names)
+    monkeypatch.setattr(notebook_substep, 'inputs', lambda **kwargs: input_urls, raising=False)
+    return notebook_substep
+
+def test_load_inputs_shares_one_spark_session(monkeypatch):
+    notebook_substep = _substep_with_inputs(monkeypatch, ['a', 'b', 'c'])
+    monkeypatch.setattr(substep, '_parquet_size', lambda url: None)
+    sessions = []
+    monkeypatch.setattr(substep, '_spark_session', lambda: sessions.append(threading.get_ident()) or 'session')
+    readers = []
+    monkeypatch.setattr(substep, '_read_parquet_by_spark', lambda url, as_, spark: readers.append(spark) or url)
+
+    input_data = notebook_substep.load_inputs('step')
+
+    assert (input_data.a, input_data.b, input_data.c) == ('a', 'b', 'c')
+    assert sessions == [threading.get_ident()]
+    assert readers == ['session'] * 3
+
+def test_load_inputs_runs_no_spark_session_for_small_inputs(monkeypatch):
+    notebook_substep = _substep_with_inputs(monkeypatch, ['a', 'b'])
+    monkeypatch.setattr(substep, '_parquet_size', lambda url: 0)
+    monkeypatch.setattr(substep, '_spark_session', lambda: pytest.fail('Apache Spark session is run'))
+    monkeypatch.setattr(substep, '_read_parquet_by_arrow', lambda url, as_: url)
+
+    input_data = notebook_substep.load_inputs('step')
+
+    assert (input_data.a, input_data.b) == ('a', 'b')
+
+def test_arrow_readers_use_sinara_filesystem(monkeypatch, work_dir):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from sinara import arrow_archive
+    pq.write_table(pa.table({'x': [1, 2, 3]}), 'input.parquet')
+    resolved = []
+    def arrow_filesystem(url):
+        resolved.append(url)
+        return pa.fs.LocalFileSystem(), str(work_dir / 'input.parquet')
+    monkeypatch.setattr(arrow_archive, '_arrow_filesystem', arrow_filesystem)
+
+    assert substep._parquet_size('s3://bucket/input.parquet') > 0
+    assert substep._read_parquet_by_arrow('s3://bucket/input.parquet', 'arrow').num_rows == 3
+    assert resolved == ['s3://bucket/input.parquet'] * 2